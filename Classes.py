@@ -6,74 +6,150 @@ from evaluation import *
 import random
 import uuid
 
+class ServerSpec:
+    """ Immutable data of one server generation, shared by every Server of that generation (flyweight). """
+    __slots__ = ('generation', 'server_type', 'release_time', 'release_time_start', 'release_time_end',
+                 'purchase_price', 'slots_size', 'energy_consumption', 'capacity', 'life_expectancy',
+                 'cost_of_moving', 'maintenance_fee', 'selling_prices', 'index')
+
+    def __init__(self, server_row, selling_prices):
+        set_value = super().__setattr__
+        set_value('generation', server_row['server_generation'])
+        # Position of the generation in get_known('server_generation'), -1 when it is unknown
+        generations = get_known('server_generation')
+        set_value('index', generations.index(self.generation) if self.generation in generations else -1)
+        set_value('server_type', server_row['server_type'])
+        set_value('release_time', server_row['release_time'])
+        set_value('release_time_start', int(server_row['release_start']))
+        set_value('release_time_end', int(server_row['release_end']))
+        set_value('purchase_price', server_row['purchase_price'])
+        set_value('slots_size', server_row['slots_size'])
+        set_value('energy_consumption', server_row['energy_consumption'])
+        set_value('capacity', server_row['capacity'])
+        set_value('life_expectancy', server_row['life_expectancy'])
+        set_value('cost_of_moving', server_row['cost_of_moving'])
+        set_value('maintenance_fee', server_row['average_maintenance_fee'])
+        # Selling price by latency sensitivity
+        set_value('selling_prices', dict(selling_prices))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"ServerSpec of {self.generation} is read-only.")
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        # Pickle and deepcopy (e.g. the initargs of a 'spawn' pool) restore the slots past __setattr__
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return f"ServerSpec({self.generation})"
+
+class ServerCatalog:
+    """ One ServerSpec per server generation, built once from servers_df and selling_prices_df. """
+    def __init__(self, servers_df, selling_prices_df):
+        servers_df = parse_release_times(servers_df)
+        self.specs = {}
+        for server_row in servers_df.to_dict('records'):
+            prices = selling_prices_df[selling_prices_df['server_generation'] == server_row['server_generation']]
+            selling_prices = zip(prices['latency_sensitivity'], prices['selling_price'].tolist())
+            self.specs[server_row['server_generation']] = ServerSpec(server_row, selling_prices)
+
+    def __getitem__(self, generation):
+        return self.specs[generation]
+
+    def __contains__(self, generation):
+        return generation in self.specs
+
 class Server:
+    __slots__ = ('identifier', 'spec', 'data_center_object', 'deployed', 'operational_time')
+
     def __init__(self, givens, generation, data_center, data_center_object, identifier=None):
-        self.generation = generation
-        self.data_center = data_center
+        # data_center is kept for compatibility, the datacenter is data_center_object
+        self.spec = givens.server_catalog[generation]
         self.data_center_object = data_center_object
-        self.identifier = identifier
-        self._givens = givens
+        self.identifier = identifier if identifier else uuid.uuid4().hex
         self.deployed = False
         self.operational_time = 0
-        self.release_time = self._givens.servers_df[self._givens.servers_df['server_generation'] == self.generation].iloc[0]['release_time']
-        s = self.release_time.strip("[]")
-        self.identifier = identifier if identifier else uuid.uuid4().hex
-        numbers = [int(num) for num in s.split(",")]
-        self.release_time_start = numbers[0]
-        self.release_time_end = numbers[1]
-        self.capacity = self._givens.servers_df[self._givens.servers_df['server_generation'] == self.generation].iloc[0]['capacity']
 
-        # Fetch server data once to avoid repeated calls
-        self.server_data = self._givens.servers_df[self._givens.servers_df['server_generation'] == self.generation].iloc[0]
-        self.selling_price_data = self._givens.selling_prices_df[self._givens.selling_prices_df['server_generation'] == self.generation]
+    @property
+    def generation(self):
+        return self.spec.generation
+
+    @property
+    def data_center(self):
+        return self.data_center_object.identifier
+
+    @data_center.setter
+    def data_center(self, data_center_object):
+        self.data_center_object = data_center_object
+
+    @property
+    def release_time(self):
+        return self.spec.release_time
+
+    @property
+    def release_time_start(self):
+        return self.spec.release_time_start
+
+    @property
+    def release_time_end(self):
+        return self.spec.release_time_end
+
+    @property
+    def capacity(self):
+        return self.spec.capacity
 
     @property
     def status(self):
         return {
             "type": self.generation,
-            "capacity_used": self.server_data['capacity'] if self.deployed else 0,
+            "capacity_used": self.spec.capacity if self.deployed else 0,
             "uptime": self.operational_time,
             "latency_sensitivity": self.data_center_object.latency_sensitivity,
         }
 
     @property
     def slots_needed(self):
-        return self.server_data['slots_size']
+        return self.spec.slots_size
 
     @property
     def energy_consumption(self):
-        return self.server_data['energy_consumption']
+        return self.spec.energy_consumption
 
     @property
     def purchase_price(self):
-        return self.server_data['purchase_price']
+        return self.spec.purchase_price
 
     @property
     def life_expectancy(self):
-        return self.server_data['life_expectancy']
+        return self.spec.life_expectancy
 
     @property
     def cost_of_moving(self):
-        return self.server_data['cost_of_moving']
+        return self.spec.cost_of_moving
 
     @property
     def maintenance_fee(self):
-        return self.server_data['average_maintenance_fee']
+        return self.spec.maintenance_fee
 
     @property
     def selling_price(self):
         if not self.deployed:
             return None
-        # Ensure there is a price row available
-        #print("<<<<<<HERE>>>>>>>", self.data_center_object.latency_sensitivity);
-        price_row = self.selling_price_data[self.selling_price_data['latency_sensitivity'] == self.data_center_object.latency_sensitivity]
-        return price_row['selling_price'].iloc[0] if not price_row.empty else None
+        # None when there is no price for the latency sensitivity of the datacenter
+        return self.spec.selling_prices.get(self.data_center_object.latency_sensitivity)
 
     def deploy(self):
+        if not self.deployed and self.data_center_object is not None:
+            self.data_center_object.update_deployed_totals(self.spec, 1)
         self.deployed = True
         self.operational_time = 0
 
     def decommission(self):
+        if self.deployed and self.data_center_object is not None:
+            self.data_center_object.update_deployed_totals(self.spec, -1)
         self.deployed = False
         #print(f"Server {self.identifier} decommissioned.")
 
@@ -89,8 +165,9 @@ class Server:
         self.automate_remove_dead_cells()
 
 class DataCenter:
-    def __init__(self, givens, identifier):
+    def __init__(self, givens, identifier, debugging=False):
         self._givens = givens
+        self.debugging = debugging
         self.identifier = identifier
         self.datacenter_data = self._givens.datacenters_df[self._givens.datacenters_df['datacenter_id'] == identifier].iloc[0]
         self.servers = []
@@ -100,32 +177,99 @@ class DataCenter:
         self.current_time_step = 0
         self.cost_of_energy = self.datacenter_data['cost_of_energy']
         self.latency_sensitivity = self.datacenter_data['latency_sensitivity']
+        # Running totals, kept up to date by add, remove and update_deployed_totals
+        self.total_capacity = 0
+        self.deployed_slots = 0
+        self.deployed_capacity = {}
+        self.deployed_energy = 0
+        self.deployed_maintenance = 0
+        # Number of servers in self.servers by generation index, deployed or not
+        self.server_counts = np.zeros(len(get_known('server_generation')), dtype=np.int64)
+
+    def add(self, server):
+        """ Puts a server in this data center and counts it in the running totals. """
+        self.servers.append(server)
+        self.server_counts[server.spec.index] += 1
+        self.total_capacity += server.capacity
+        if server.deployed:
+            self.update_deployed_totals(server.spec, 1)
+
+    def add_block(self, servers):
+        """ Puts a block of deployed servers of one generation in this data center with a single update of the running totals. """
+        if not servers:
+            return
+        spec = servers[0].spec
+        self.servers.extend(servers)
+        self.server_counts[spec.index] += len(servers)
+        self.total_capacity += len(servers) * spec.capacity
+        self.update_deployed_totals(spec, len(servers))
+
+    def remove(self, server):
+        """ Takes a server out of this data center and the running totals. """
+        self.servers.remove(server)
+        self.server_counts[server.spec.index] -= 1
+        self.total_capacity -= server.capacity
+        if server.deployed:
+            self.update_deployed_totals(server.spec, -1)
+
+    def update_deployed_totals(self, spec, count):
+        """ Adds (count > 0) or subtracts (count < 0) deployed servers of one generation from the running totals. """
+        self.deployed_slots += count * spec.slots_size
+        self.deployed_capacity[spec.generation] = self.deployed_capacity.get(spec.generation, 0) + count * spec.capacity
+        self.deployed_energy += count * spec.energy_consumption
+        self.deployed_maintenance += count * spec.maintenance_fee
+
+    def get_used_capacity(self):
+        return sum(self.deployed_capacity.values())
+
+    def check_totals(self):
+        """ Debugging invariant: the running totals must match a full recomputation over self.servers. """
+        deployed = [server for server in self.servers if server.deployed]
+        deployed_capacity = {}
+        for server in deployed:
+            deployed_capacity[server.generation] = deployed_capacity.get(server.generation, 0) + server.capacity
+        expected = {
+            "total_capacity": sum(server.capacity for server in self.servers),
+            "deployed_slots": sum(server.slots_needed for server in deployed),
+            "deployed_capacity": deployed_capacity,
+            "deployed_energy": sum(server.energy_consumption for server in deployed),
+            "deployed_maintenance": sum(server.maintenance_fee for server in deployed),
+        }
+        actual = {
+            "total_capacity": self.total_capacity,
+            "deployed_slots": self.deployed_slots,
+            "deployed_capacity": {k: v for k, v in self.deployed_capacity.items() if k in deployed_capacity or v != 0},
+            "deployed_energy": self.deployed_energy,
+            "deployed_maintenance": self.deployed_maintenance,
+        }
+        if actual != expected:
+            raise AssertionError(f"Running totals of {self.identifier} are out of sync: {actual} != {expected}")
 
     def get_total_maintenance_cost(self):
-        return sum(server.maintenance_fee for server in self.servers if server.deployed)
+        return self.deployed_maintenance
 
     def get_total_energy_cost(self):
-        return sum(server.energy_consumption for server in self.servers if server.deployed) * self.datacenter_data['cost_of_energy']
+        return self.deployed_energy * self.datacenter_data['cost_of_energy']
 
     def summary(self):
         return {
-            "total_capacity": sum(server.capacity for server in self.servers),
-            "available_capacity": sum(server.capacity for server in self.servers if not server.deployed),
+            "total_capacity": self.total_capacity,
+            "available_capacity": self.total_capacity - self.get_used_capacity(),
             "energy_cost": self.get_total_energy_cost(),
             "servers": [server.status for server in self.servers]
         }
     
     def calculate_utilization(self):
-        total_capacity = sum(server.capacity for server in self.servers)
-        used_capacity = sum(server.capacity for server in self.servers if server.deployed)
+        total_capacity = self.total_capacity
+        used_capacity = self.get_used_capacity()
         utilization = (used_capacity / total_capacity) * 100 if total_capacity > 0 else 0
         return utilization
 
     def utilization_summary(self):
         return {
             "data_center_id": self.identifier,
-            "total_capacity": sum(server.capacity for server in self.servers),
-            "used_capacity": sum(server.capacity for server in self.servers if server.deployed),
+            "total_capacity": self.total_capacity,
+            "used_capacity": self.get_used_capacity(),
             "utilization": self.calculate_utilization(),
             "servers": [server.status for server in self.servers]
         }
@@ -138,7 +282,7 @@ class DataCenter:
         self.update_empty_slots()
 
     def update_empty_slots(self):
-        self.empty_slots = self.total_slots - sum(server.slots_needed for server in self.servers if server.deployed)
+        self.empty_slots = self.total_slots - self.deployed_slots
     
     def update_occupied_slots(self):
         self.occupied_slots = self.total_slots - self.empty_slots
@@ -147,11 +291,13 @@ class DataCenter:
         self.update_time_step()
         self.update_slots()
         self.update_occupied_slots()
+        if self.debugging:
+            self.check_totals()
 
 class Inventory:
-    def __init__(self, givens):
+    def __init__(self, givens, debugging=False):
         self._givens = givens
-        self.datacenters = [DataCenter(givens, dc_id) for dc_id in givens.datacenters_df['datacenter_id']]
+        self.datacenters = [DataCenter(givens, dc_id, debugging) for dc_id in givens.datacenters_df['datacenter_id']]
         self.DC1 = self.datacenters[0]
         self.DC2 = self.datacenters[1]
         self.DC3 = self.datacenters[2]
@@ -159,6 +305,18 @@ class Inventory:
         self.current_time_step = 0
         self.expenses = ExpensesReturns()
         self.utilization_log = []
+        # Server IDs are a random per-inventory prefix plus a counter
+        self.server_id_prefix = uuid.uuid4().hex[:16]
+        self.next_server_number = 0
+
+    def allocate_server_ids(self, quantity):
+        """ Reserves a contiguous block of server numbers and returns the first one. """
+        first = self.next_server_number
+        self.next_server_number += quantity
+        return first
+
+    def get_server_id(self, number):
+        return format_server_id(self.server_id_prefix, number)
 
     def log_utilization(self):
         for dc in self.datacenters:
@@ -185,19 +343,20 @@ class Inventory:
     def get_utilization_log(self):
         return self.utilization_log
 
+    def get_server_counts(self):
+        """ Number of servers by (datacenter, generation index), in the order of self.datacenters. """
+        return np.stack([dc.server_counts for dc in self.datacenters])
+
     def get_aggregated_server_capacities(self):
         """ Aggregates server capacities by server generation across all datacenters. """
-        capacity_data = []
+        capacity_data = {}
         for dc in self.datacenters:
-            for server in dc.servers:
-                if server.deployed:
-                    capacity_data.append({
-                        'server_generation': server.generation,
-                        'capacity': server.capacity
-                    })
-        df = pd.DataFrame(capacity_data)
-        if not df.empty:
-            return df.groupby('server_generation')['capacity'].sum().to_frame('capacity')
+            for generation, capacity in dc.deployed_capacity.items():
+                capacity_data[generation] = capacity_data.get(generation, 0) + capacity
+        capacity_data = {generation: capacity for generation, capacity in capacity_data.items() if capacity > 0}
+        if capacity_data:
+            df = pd.Series(capacity_data, name='capacity').rename_axis('server_generation').sort_index()
+            return df.to_frame('capacity')
         return pd.DataFrame(columns=['capacity'])
 
     def move_server(self, server_type, quantity, source_dc_id, target_dc_id):
@@ -211,8 +370,8 @@ class Inventory:
 
             if len(servers_to_move) == quantity and all(target_dc.empty_slots >= s.slots_needed for s in servers_to_move):
                 for server in servers_to_move:
-                    source_dc.servers.remove(server)
-                    target_dc.servers.append(server)
+                    source_dc.remove(server)
+                    target_dc.add(server)
                     server.data_center = target_dc
                     print(f"Successfully moved server {server.identifier} to {target_dc_id}.")
                     self.expenses.add_moving_cost(server.cost_of_moving)
@@ -247,36 +406,24 @@ class Inventory:
             #print(f"Not enough slots to deploy {quantity} servers of type {server_type} in data center DC{datacenter_id}. Needed: {slots_needed * quantity}, Available: {datacenter.empty_slots}")
             return []
         
-        final = []
-        for _ in range(quantity):
-            details = []
-            # Create a new server with a unique UUID and datacenter identifier
-            new_server = Server(self._givens, server_generation, f"DC{datacenter_id}", datacenter, uuid.uuid4().hex)
-            #print(f"<<<BUY>>><<<<CAPACITY>>>> {new_server.capacity}")
-            datacenter.servers.append(new_server)
-            datacenter.update_slots()
-            new_server.deploy()
-            new_server_json = {
-                "time_step": current_time_step,
-                "datacenter_id": f"{new_server.data_center_object.identifier}",
-                "server_generation": server_generation,
-                "server_id": new_server.identifier,
-                "action": "buy"
-            }
-            current = []
-            current.append(new_server_json)
-            current_json.append(current)
-            # details.append(new_server.identifier)
-            # details.append(new_server.generation)
-            # details.append(new_server.data_center)
-            # details.append(new_server.data_center_object.latency_sensitivity)
-            #print(f"Server {new_server.identifier} of type {server_type} deployed in data center DC{datacenter_id}.")
-            # final.append(details)
+        # Reserve the slots and a block of server IDs once for the whole purchase
+        first = self.allocate_server_ids(quantity)
+        new_servers = []
+        for number in range(first, first + quantity):
+            new_server = Server(self._givens, server_generation, datacenter.identifier, datacenter, self.get_server_id(number))
+            new_server.deployed = True
+            new_servers.append(new_server)
+        datacenter.add_block(new_servers)
+
+        # The whole block is one transaction, it is expanded to one JSON row per server when it is written
+        batch = TransactionBatch(current_time_step, datacenter.identifier, server_generation, "buy", self.server_id_prefix, first, quantity)
+        current_json.append(batch)
 
         # Update Empty Slots
         #print(f"Empty slots before: {datacenter.empty_slots}")
         datacenter.update_empty_slots()
         #print(f"Empty slots after: {datacenter.empty_slots}")
+        return batch
 
     def remove_server(self, server_type, quantity, datacenter_id):
         datacenter = self.get_datacenter_by_id(datacenter_id)
@@ -285,8 +432,8 @@ class Inventory:
             if len(matching_servers) >= quantity:
                 servers_to_remove = random.sample(matching_servers, quantity)
                 for server in servers_to_remove:
-                    datacenter.servers.remove(server)
                     server.decommission()
+                    datacenter.remove(server)
                 return True  # Indicating success
             else:
                 print(f"Not enough servers of type {server_type} to remove {quantity} units from data center {datacenter_id}.")
@@ -320,6 +467,42 @@ class Inventory:
     def get_datacenter_latency_sensitivity(self, server_type) :
         return self._givens.servers_df[self._givens.servers_df['server_generation'] == server_type].iloc[0]['latency_sensitivity']
 
+def format_server_id(prefix, number):
+    # 32 hex characters, like uuid.uuid4().hex
+    return f"{prefix}{number:016x}"
+
+class TransactionBatch:
+    """ One action applied to a contiguous block of servers, stored as columns instead of one dict per server. """
+    __slots__ = ('time_step', 'datacenter_id', 'server_generation', 'action', 'server_id_prefix', 'first', 'quantity')
+
+    def __init__(self, time_step, datacenter_id, server_generation, action, server_id_prefix, first, quantity):
+        self.time_step = time_step
+        self.datacenter_id = datacenter_id
+        self.server_generation = server_generation
+        self.action = action
+        self.server_id_prefix = server_id_prefix
+        self.first = first
+        self.quantity = quantity
+
+    def __len__(self):
+        return self.quantity
+
+    def __repr__(self):
+        return f"TransactionBatch({self.time_step}, {self.datacenter_id}, {self.server_generation}, {self.action}, {self.quantity})"
+
+    def server_ids(self):
+        return [format_server_id(self.server_id_prefix, number) for number in range(self.first, self.first + self.quantity)]
+
+    def records(self):
+        """ Expands the batch to one solution row per server. """
+        return [{
+            "time_step": self.time_step,
+            "datacenter_id": self.datacenter_id,
+            "server_generation": self.server_generation,
+            "server_id": server_id,
+            "action": self.action
+        } for server_id in self.server_ids()]
+
 class ExpensesReturns:
     def __init__(self):
         self.total_costs = {
@@ -382,6 +565,7 @@ class ExpensesReturns:
 class ProblemData:
     def __init__(self):
         self.datacenters_df, self.servers_df, self.selling_prices_df = load_problem_data_without_demand()
+        self.server_catalog = ServerCatalog(self.servers_df, self.selling_prices_df)
         # print("IMPORTANT: The ProblemData Class should not be changed. It is used to load the data for the problem.")
         # print("Columns and Head of ProblemData: datacenters_df: ")
         # print(self.datacenters_df.columns)
@@ -399,6 +583,7 @@ class InputDemandDataActual:
         np.random.seed(seed)
         self.sample_demand_data_df = load_demand()
         self.demand_data_df = self.adjust_demand_with_hackathon_method(self.sample_demand_data_df)
+        self.build_demand_index()
         # print("IMPORTANT: The InputDemandDataActual AND YOUR ORIGINAL COPIES should not be changed BECAUSE THE AGENT NEEDS TO BE TRAINED ON THE ORIGINAL INPUT FORMAT HOW THEY APPEAR.")
         # print("Columns and Head of Hackathon Input Format demand data: ")
         # print(self.demand_data_df.columns)
@@ -413,21 +598,74 @@ class InputDemandDataActual:
     def adjust_demand_with_hackathon_method(self, demand_df):
         return get_actual_demand(demand_df)
     
-    def get_demand_for_time_step(self, time_step):
-        filtered_df = self.demand_data_df[self.demand_data_df['time_step'] == time_step]
-        return filtered_df
-    def get_future_demand(self, server_type, latency_sensitivity, magic_number_future, current_time_step):
-        # Calculate the last time step to consider in the future demand calculation
-        future_last_time_step = current_time_step + magic_number_future
-
-        # Filter demand data for the specific server type and latency sensitivity across the required future time steps
-        future_demand = self.demand_data_df[
-            (self.demand_data_df['server_generation'] == server_type) &
-            (self.demand_data_df['time_step'] > current_time_step) &
-            (self.demand_data_df['time_step'] <= future_last_time_step)
-        ]
+    def build_demand_index(self):
+        """ Builds the dense (time_step, server_generation, latency_sensitivity) demand cube, its prefix sums over time and the row offsets of every time step in demand_data_df. """
+        df = self.demand_data_df
+        time_steps = df['time_step'].values
+        self.max_time_step = int(time_steps.max()) if len(time_steps) else 0
+        self.generation_index = {sg: i for i, sg in enumerate(get_known('server_generation'))}
+        self.latency_sensitivity_index = {ls: i for i, ls in enumerate(get_known('latency_sensitivity'))}
+        # Missing (time_step, server_generation) rows have no demand
+        self.demand_cube = np.zeros((self.max_time_step + 1, len(self.generation_index), len(self.latency_sensitivity_index)), dtype=np.int64)
+        self.demand_cube[time_steps, get_generation_index(df['server_generation'])] = df[get_known('latency_sensitivity')].values
+        self.demand_prefix = np.cumsum(self.demand_cube, axis=0)
+        # Generation index and demand (in get_known('latency_sensitivity') order) of every row of demand_data_df
+        self.demand_generations = get_generation_index(df['server_generation'])
+        self.demand_values = df[get_known('latency_sensitivity')].values
+        # Future demand tables by window length, see get_future_demand_window
+        self.future_demand_windows = {}
+        # demand_data_df is sorted by time_step, so the rows of a time step are one contiguous block
+        self.time_step_offsets = np.searchsorted(time_steps, np.arange(self.max_time_step + 2))
 
-        # Summing up future demand values for 'high', 'low', 'medium'
-        total_future_demand = future_demand[f'{latency_sensitivity}'].sum()
+    def get_demand_for_time_step(self, time_step):
+        if time_step < 0 or time_step > self.max_time_step:
+            return self.demand_data_df.iloc[0:0]
+        start, end = self.time_step_offsets[time_step], self.time_step_offsets[time_step + 1]
+        return self.demand_data_df.iloc[start:end]
+
+    def get_demand_arrays_for_time_step(self, time_step):
+        """ Returns the generation indices and the (row x latency_sensitivity) demand of the rows of get_demand_for_time_step. """
+        if time_step < 0 or time_step > self.max_time_step:
+            return self.demand_generations[0:0], self.demand_values[0:0]
+        start, end = self.time_step_offsets[time_step], self.time_step_offsets[time_step + 1]
+        return self.demand_generations[start:end], self.demand_values[start:end]
+
+    def get_demand_cube_for_time_step(self, time_step):
+        """ Returns the (server_generation x latency_sensitivity) demand at a time step as a NumPy array. """
+        return self.demand_cube[time_step]
 
-        return total_future_demand
\ No newline at end of file
+    def get_future_demand(self, server_type, latency_sensitivity, magic_number_future, current_time_step):
+        g = self.generation_index.get(server_type)
+        if g is None:
+            return 0
+        ls = self.latency_sensitivity_index[latency_sensitivity]
+        return self.get_future_demands(g, ls, magic_number_future, current_time_step)
+
+    def get_future_demands(self, generations, latency_sensitivities, magic_number_future, current_time_step):
+        """ Same as get_future_demand for arrays of generation and latency sensitivity indices. """
+        if 0 <= current_time_step <= self.max_time_step:
+            return self.get_future_demand_window(magic_number_future)[current_time_step, generations, latency_sensitivities]
+        # Sum of the demand over (current_time_step, current_time_step + magic_number_future] from the prefix sums
+        first = min(max(current_time_step, 0), self.max_time_step)
+        last = min(max(current_time_step + magic_number_future, 0), self.max_time_step)
+        if last <= first:
+            return np.zeros(np.shape(generations), dtype=self.demand_prefix.dtype)[()]
+        return self.demand_prefix[last, generations, latency_sensitivities] - self.demand_prefix[first, generations, latency_sensitivities]
+
+    def get_future_demand_window(self, magic_number_future):
+        """ Future demand over the next magic_number_future time steps for every (time_step, server_generation, latency_sensitivity), computed once per window length. """
+        if magic_number_future not in self.future_demand_windows:
+            self.get_future_demand_windows([magic_number_future])
+        return self.future_demand_windows[magic_number_future]
+
+    def get_future_demand_windows(self, windows):
+        """ Future demand tables of many window lengths, shaped (window, time_step, server_generation, latency_sensitivity). The missing windows are computed in one batch and cached. """
+        missing = [w for w in dict.fromkeys(windows) if w not in self.future_demand_windows]
+        if missing:
+            time_steps = np.arange(self.max_time_step + 1)
+            last = np.clip(time_steps[None, :] + np.asarray(missing)[:, None], 0, self.max_time_step)
+            future_demand = self.demand_prefix[last] - self.demand_prefix[time_steps][None]
+            # Windows that end before they start have no future demand
+            future_demand[last <= time_steps[None, :]] = 0
+            self.future_demand_windows.update(zip(missing, future_demand))
+        return np.stack([self.future_demand_windows[w] for w in windows])
@@ -1,110 +1,111 @@
 import numpy as np
 import pandas as pd
 from Classes import *
+from solution_writer import get_solution_writer, get_solution_extension
 from scipy.stats import truncweibull_min
 
+# Datacenters to buy in by latency sensitivity of the default policy
+DATACENTER_PREFERENCES = {'high': ['DC3', 'DC4'], 'medium': ['DC2'], 'low': ['DC1']}
+
 class Simulation:
-    def __init__(self, givens, input_actual, seed, time_steps, debugging):
+    def __init__(self, givens, input_actual, seed, time_steps, debugging, output_path=None, output_format='json', magic_number_future=30, datacenter_preferences=None):
         # CONSTANTS or PROPERTIES!!!
-        self.magic_number_future = 30
+        # Number of time steps of future demand looked at before buying
+        self.magic_number_future = magic_number_future
+        # Datacenters to buy in by latency sensitivity, the first one with empty slots is picked
+        self.datacenter_preferences = datacenter_preferences or DATACENTER_PREFERENCES
         self.givens = givens
         self.demand = input_actual
         self.end_time_step = time_steps
         self.debugging = debugging
-        self.inventory = Inventory(givens)
+        self.inventory = Inventory(givens, debugging)
+        # Capacity and release window by generation index
+        self.tables = get_fleet_tables(givens.servers_df, givens.datacenters_df)
         self.capacities = []
         # Variables
         self.current_demand = None
         self.seed = seed
         self.current_time_step = 0
+        # Actions of the current time step, flushed to the solution writer after every time step
         self.transactions = []
+        self.output_format = output_format
+        self.output_path = output_path if output_path else f'{seed}.{get_solution_extension(output_format)}'
 
     def start_simulation(self):
         self.capacities = self.inventory.get_aggregated_server_capacities()
         self.current_demand = self.demand.get_demand_for_time_step(self.current_time_step)
         print(self.demand.demand_data_df)
-        while self.current_time_step < self.end_time_step:
-            # Step 1: Age the servers
-            self.inventory.update()
-            # Because Aging them can reveal more slots so we can buy servers without unavailable slots BIASING OUR DECISION
-            self.current_time_step += 1
-            # Action
-            self.buy()
-            # Update Inventory according to: 1. Inreased Time Step and 2. Actions
-            self.inventory.update()
-        with open(f'{self.seed}.json', 'a') as f:
-            f.write('\n')
-            json.dump(self.transactions, f, indent=4)
+        with get_solution_writer(self.output_path, self.output_format) as writer:
+            while self.current_time_step < self.end_time_step:
+                # Step 1: Age the servers
+                self.inventory.update()
+                # Because Aging them can reveal more slots so we can buy servers without unavailable slots BIASING OUR DECISION
+                self.current_time_step += 1
+                # Action
+                self.buy()
+                # Stream the actions of this time step to the solution file
+                writer.write(self.transactions)
+                self.transactions = []
+                # Update Inventory according to: 1. Inreased Time Step and 2. Actions
+                self.inventory.update()
 
     def buy(self):
         # Access current demand for the timestep
-        current_demand = self.demand.get_demand_for_time_step(self.current_time_step)
-        current_demand.columns.name = None
-        if current_demand.empty:
+        generations, demand = self.demand.get_demand_arrays_for_time_step(self.current_time_step)
+        if len(generations) == 0:
             return  # No demand to satisfy
 
-        print(f"Current Demand: {current_demand}")
-        print("---------")
-
-        # Evaluate each demand row for potential purchase
-        for index, demand_row in current_demand.iterrows():
-            print(f"Processing Demand Row: {demand_row}")
-            server_type = demand_row['server_generation']
-            release_time = self.inventory._givens.servers_df[self.inventory._givens.servers_df['server_generation'] == server_type]['release_time'].iloc[0]
-            release_time = release_time[1:-1]  # Remove the leading '[' and trailing ']'
-            release_start, release_end = release_time.split(',')
-            release_start = int(release_start.strip())
-            release_end = int(release_end.strip())
-            if self.current_time_step < release_start or self.current_time_step > release_end:
-                continue
-            # Maximum of demand_row['high'], demand_row['low'] and demand_row['medium']
-            latency_sensitivity = demand_row[['high', 'low', 'medium']].idxmax()
-            print(f"Server Type: {server_type}, Latency Sensitivity: {latency_sensitivity}")
-            # Determine future demand and profitability
-            future_demand = self.demand.get_future_demand(server_type, latency_sensitivity, self.magic_number_future, self.current_time_step)
-            if not future_demand:
-                continue  # Skip if no future demand is predicted
-
-            if latency_sensitivity == 'high':
-                if self.inventory.DC3.empty_slots > 0:
-                    pick_dc = 'DC3'
-                else:
-                    if self.inventory.DC4.empty_slots > 0:
-                        pick_dc = 'DC4'
-            elif latency_sensitivity == 'low':
-                if self.inventory.DC1.empty_slots > 0:
-                    pick_dc = 'DC1'
-            else:
-                if self.inventory.DC2.empty_slots > 0:
-                    pick_dc = 'DC2'
-            # self.capacities = self.inventory.get_aggregated_server_capacities()
-            # print("---------")
-            # print(f"Capacities: {self.capacities}")
-            # print("---------")
-            capacity_value = self.inventory._givens.servers_df[self.inventory._givens.servers_df['server_generation'] == server_type]['capacity'].iloc[0]
-            quanity_needed = demand_row[f'{latency_sensitivity}'] // capacity_value
-            # Something like - quanity_present = self.inventory.'f{pick_dc}'.servers.query(f"server_generation == '{server_type}'")['quantity'].iloc[0]
-            # like if ...servers[i].generation == server_type: quanity_present+=1
-            server_list = getattr(self.inventory, f'{pick_dc}').servers
-
-            # Initialize the counter
-            quantity_present = 0
+        if self.debugging:
+            print(f"Current Demand: {self.demand.get_demand_for_time_step(self.current_time_step)}")
+            print("---------")
 
-            # Loop through each server in the list
-            for server in server_list:
-                if server.generation == server_type:
-                    quantity_present += 1
-            
-            quanity_to_buy = quanity_needed - quantity_present
-            if quanity_to_buy <= 0:
-                quanity_to_buy = 0
-            print(f"Quantity Needed: {quanity_needed}")
-            print(f"Quantity Present: {quantity_present}")
-            print(f"Quantity to Buy: {quanity_to_buy}")
+        # Plan every demand row at once, then buy row by row because every purchase changes the empty slots
+        plan = self.plan_purchases(generations, demand)
+        datacenters = self.inventory.get_all_datacenters_identifiers()
+        server_generations = get_known('server_generation')
+        latency_sensitivities = get_known('latency_sensitivity')
+        pick_dc = None
+        for g, ls, quanity_needed in zip(*plan):
+            server_type = server_generations[g]
+            latency_sensitivity = latency_sensitivities[ls]
+            if self.debugging:
+                print(f"Server Type: {server_type}, Latency Sensitivity: {latency_sensitivity}")
+            # First datacenter of the latency sensitivity with empty slots, else the datacenter of the previous row
+            for dc_id in self.datacenter_preferences[latency_sensitivity]:
+                if getattr(self.inventory, dc_id).empty_slots > 0:
+                    pick_dc = dc_id
+                    break
+            if pick_dc is None:
+                continue  # No datacenter to buy in yet
+            quantity_present = self.inventory.get_datacenter_by_id(pick_dc).server_counts[g]
+            quanity_to_buy = max(int(quanity_needed - quantity_present), 0)
+            if self.debugging:
+                print(f"Quantity Needed: {quanity_needed}")
+                print(f"Quantity Present: {quantity_present}")
+                print(f"Quantity to Buy: {quanity_to_buy}")
             if quanity_to_buy <= 0:
                 continue
             added = self.inventory.add_server(server_type, quanity_to_buy, pick_dc, self.current_time_step, self.transactions)
-            print(f"Added: {added}")
+            if self.debugging:
+                # The batch expanded to the actions it added, one per server ([] when nothing was bought)
+                print(f"Added: {added.records() if isinstance(added, TransactionBatch) else added}")
+
+    def plan_purchases(self, generations, demand):
+        """
+        Vectorized part of buy for the demand rows of the current time step: the rows of
+        generations that are released, with a future demand for their largest latency
+        sensitivity. Returns their generation indices, latency sensitivity indices and
+        the number of servers needed for the current demand, in demand row order.
+        """
+        ts = self.current_time_step
+        released = (self.tables['release_start'][generations] <= ts) & (ts <= self.tables['release_end'][generations])
+        latency_sensitivities = get_latency_sensitivity_choices(demand)
+        # Future demand over the next magic_number_future time steps, read from the cached window table
+        future_demand = self.demand.get_future_demands(generations, latency_sensitivities, self.magic_number_future, ts)
+        rows = np.flatnonzero(released & (future_demand != 0))
+        g, ls = generations[rows], latency_sensitivities[rows]
+        quantity_needed = demand[rows, ls] // self.tables['capacity'][g]
+        return g, ls, quantity_needed
 
     def calculate_profit_margin(self, server_type, latency_sensitivity, demand):
         # Placeholder to calculate expected profit margin
@@ -116,7 +117,33 @@ class Simulation:
         )['purchase_price'].iloc[0]
         return sell_price - buy_cost
 
-def solution_function(givens, input_actual, seed = 8501, time_steps=168, debugging=False):
-    simulation = Simulation(givens, input_actual, seed, time_steps, debugging)
+def get_latency_sensitivity_choices(demand):
+    """ Latency sensitivity index with the largest demand of every (row x latency_sensitivity) demand row, ties go to high, then low, then medium. """
+    choices = np.array([get_known('latency_sensitivity').index(ls) for ls in ['high', 'low', 'medium']])
+    return choices[np.argmax(demand[:, choices], axis=1)]
+
+def group_lookaheads(givens, input_actual, lookaheads, time_steps=168):
+    """
+    Groups the magic_number_future values that make Simulation.buy plan exactly the same
+    purchases. buy only looks at the future demand to skip the rows that have none, so two
+    lookaheads whose future demand is zero for the same demand rows give the same solution
+    and only one Simulation per group has to run. The future demand of all the lookaheads is
+    computed in one batch and stays cached in input_actual.
+    """
+    tables = get_fleet_tables(givens.servers_df, givens.datacenters_df)
+    ts = input_actual.demand_data_df['time_step'].values
+    generations = input_actual.demand_generations
+    # Demand rows that buy plans, whatever the lookahead
+    rows = (1 <= ts) & (ts <= time_steps) & (tables['release_start'][generations] <= ts) & (ts <= tables['release_end'][generations])
+    latency_sensitivities = get_latency_sensitivity_choices(input_actual.demand_values)
+    future_demand = input_actual.get_future_demand_windows(lookaheads)[:, ts[rows], generations[rows], latency_sensitivities[rows]]
+    _, group = np.unique(future_demand != 0, axis=0, return_inverse=True)
+    groups = {}
+    for lookahead, g in zip(lookaheads, group.ravel()):
+        groups.setdefault(g, []).append(lookahead)
+    return list(groups.values())
+
+def solution_function(givens, input_actual, seed = 8501, time_steps=168, debugging=False, output_path=None, output_format='json', magic_number_future=30, datacenter_preferences=None):
+    simulation = Simulation(givens, input_actual, seed, time_steps, debugging, output_path, output_format, magic_number_future, datacenter_preferences)
     simulation.start_simulation()
     return [{'message': 'Simulation Completed Successfully'}]
\ No newline at end of file
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import argparse
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+from contextlib import redirect_stdout
+from utils import load_problem_data, load_json, save_json, load_solution_columns
+from evaluation import evaluation_function, get_known
+from tracing import summarize_trace
+from Classes import ProblemData, InputDemandDataActual
+from application import Simulation
+
+'''
+
+Benchmarks of the evaluation and of the Simulation.
+
+    python benchmark.py                                  : run and print the results
+    python benchmark.py --baseline benchmarks/baseline.json
+                                                         : compare the throughput with a stored baseline
+    python benchmark.py --save benchmarks/baseline.json  : store the results as the new baseline
+    python benchmark.py --phases                         : also record the time of every phase
+
+The evaluation benchmarks time evaluation_function end to end, with tracing off,
+on synthetic solutions of a given number of rows spread over all the
+time-steps. With --phases, a second run with tracing on records the time of
+every phase (see tracing.py); it does not change the reported wall time. The solutions are generated from a fixed seed, so every run evaluates
+the same solutions. The Simulation benchmarks time Simulation.start_simulation
+for the given seeds.
+
+Throughput is reported as rows/sec and steps/sec. A benchmark regresses when its
+rows/sec falls more than --tolerance below the baseline. The comparison also
+flags evaluation benchmarks whose objective differs from the baseline. The
+script exits with status 1 when anything regressed or changed.
+
+'''
+
+BENCHMARK_SIZES = [1000, 10000, 100000, 1000000]
+
+def make_benchmark_solution(rows, seed=0, time_steps=get_known('time_steps')):
+    # SYNTHETIC VALID SOLUTION OF ABOUT rows ACTIONS SPREAD EVENLY OVER THE
+    # TIME-STEPS: EVERY TIME-STEP DISMISSES, MOVES AND HOLDS SERVERS AND BUYS
+    # WITH THE REST OF ITS ACTIONS (ONLY BUYS AT TIME-STEP 1). SERVERS ARE ONLY BOUGHT IN
+    # THEIR RELEASE WINDOW, NEVER TOUCHED AFTER THEIR LIFE EXPECTANCY AND NO
+    # DATACENTER GOES OVER 90% OF THE SMALLEST slots_capacity, SO THE SLOTS
+    # CONSTRAINT HOLDS WHATEVER THE HOME DATACENTER OF A SERVER IS.
+    rng = np.random.default_rng(seed)
+    _, datacenters, servers, _ = load_problem_data()
+    generations = servers['server_generation'].tolist()
+    slots_size = dict(zip(generations, servers['slots_size']))
+    life_expectancy = dict(zip(generations, servers['life_expectancy']))
+    release = list(zip(generations, servers['release_start'], servers['release_end']))
+    datacenter_ids = datacenters['datacenter_id'].tolist()
+    room = int(0.9 * datacenters['slots_capacity'].min())
+    used = dict.fromkeys(datacenter_ids, 0)
+    # ALIVE SERVERS: A LIST FOR RANDOM PICKS AND THE POSITION OF EVERY ID IN IT
+    alive, position, servers_info = [], {}, {}
+    expiring = {}
+    records = []
+    next_id = 0
+
+    def remove(server_id):
+        i = position.pop(server_id)
+        last = alive.pop()
+        if last != server_id:
+            alive[i] = last
+            position[last] = i
+        generation, datacenter, _ = servers_info.pop(server_id)
+        used[datacenter] -= slots_size[generation]
+
+    for ts in range(1, time_steps + 1):
+        # SERVERS BOUGHT life_expectancy TIME-STEPS AGO ARE GONE
+        for server_id in expiring.pop(ts, []):
+            if server_id in position:
+                remove(server_id)
+        # ACTIONS LEFT TO REACH rows BY THE END OF THIS TIME-STEP
+        budget = rows * ts // time_steps - len(records)
+        acted = set()
+        n_dismiss = 0 if ts == 1 else min(budget // 4, len(alive) // 4)
+        n_move = 0 if ts == 1 else budget // 4
+        # DISMISS
+        for _ in range(n_dismiss):
+            server_id = alive[rng.integers(len(alive))]
+            generation, datacenter, _ = servers_info[server_id]
+            records.append((ts, datacenter, generation, server_id, 'dismiss'))
+            remove(server_id)
+        # MOVE
+        for _ in range(min(n_move, len(alive))):
+            server_id = alive[rng.integers(len(alive))]
+            if server_id in acted:
+                continue
+            generation, datacenter, bought = servers_info[server_id]
+            target = datacenter_ids[rng.integers(len(datacenter_ids))]
+            if target == datacenter or used[target] + slots_size[generation] > room:
+                continue
+            used[datacenter] -= slots_size[generation]
+            used[target] += slots_size[generation]
+            servers_info[server_id] = (generation, target, bought)
+            acted.add(server_id)
+            records.append((ts, target, generation, server_id, 'move'))
+        # HOLD SOME OF THE SERVERS THAT ARE NOT MOVED, UP TO A QUARTER OF THE BUDGET
+        n_hold = 0 if ts == 1 else min(budget // 4, len(alive))
+        for i in rng.choice(len(alive), n_hold, replace=False):
+            server_id = alive[i]
+            if server_id not in acted:
+                generation, datacenter, _ = servers_info[server_id]
+                acted.add(server_id)
+                records.append((ts, datacenter, generation, server_id, 'hold'))
+        # BUY WITH THE REST OF THE BUDGET, WHILE THERE ARE SLOTS
+        available = [g for g, start, end in release if start <= ts <= end]
+        for _ in range(rows * ts // time_steps - len(records)):
+            generation = available[rng.integers(len(available))]
+            datacenter = datacenter_ids[rng.integers(len(datacenter_ids))]
+            if used[datacenter] + slots_size[generation] > room:
+                continue
+            server_id = f'{next_id:016x}'
+            next_id += 1
+            used[datacenter] += slots_size[generation]
+            servers_info[server_id] = (generation, datacenter, ts)
+            position[server_id] = len(alive)
+            alive.append(server_id)
+            expiring.setdefault(ts + life_expectancy[generation], []).append(server_id)
+            records.append((ts, datacenter, generation, server_id, 'buy'))
+    return pd.DataFrame.from_records(records, columns=get_known('required_columns'))
+
+def bench_evaluation(solution, engine='array', seed=3329, time_steps=get_known('time_steps'), size=None, phases=False):
+    # TIME evaluation_function END TO END ON ONE SOLUTION, WITH TRACING OFF.
+    # WITH phases, A SECOND RUN WITH TRACING ON GIVES THE TIME OF EVERY PHASE.
+    # size NAMES THE BENCHMARK (THE REQUESTED ROWS OF make_benchmark_solution).
+    demand, datacenters, servers, selling_prices = load_problem_data()
+    start = time.perf_counter()
+    objective = evaluation_function(solution.copy(), demand, datacenters, servers, selling_prices,
+                                    time_steps=time_steps, seed=seed, engine=engine)
+    wall_time = time.perf_counter() - start
+    result = {'name': f'evaluation[{engine},{size or solution.shape[0]}]',
+              'rows': int(solution.shape[0]),
+              'time_steps': time_steps,
+              'objective': objective,
+              'wall_time': wall_time,
+              'rows_per_sec': solution.shape[0] / wall_time,
+              'steps_per_sec': time_steps / wall_time}
+    if phases:
+        with tempfile.TemporaryDirectory() as tmp:
+            trace = os.path.join(tmp, 'trace.jsonl')
+            evaluation_function(solution.copy(), demand, datacenters, servers, selling_prices,
+                                time_steps=time_steps, seed=seed, engine=engine, trace=trace)
+            result['phases'] = (summarize_trace(trace)['total_us'] / 1e6).round(6).to_dict()
+    return result
+
+def bench_simulation(seed, time_steps=get_known('time_steps')):
+    # TIME Simulation.start_simulation FOR ONE SEED. THE OUTPUT OF THE
+    # SIMULATION IS WRITTEN TO A TEMPORARY FOLDER AND ITS PRINTING IS MUTED.
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        givens = ProblemData()
+        actual_demand = InputDemandDataActual(seed = seed)
+        output_path = os.path.join(tmp, f'{seed}.json')
+        simulation = Simulation(givens, actual_demand, seed, time_steps, False, output_path)
+        start = time.perf_counter()
+        simulation.start_simulation()
+        wall_time = time.perf_counter() - start
+        try:
+            rows = len(load_solution_columns(output_path)['time_step'])
+        except KeyError:
+            rows = 0
+    return {'name': f'simulation[{seed}]',
+            'rows': rows,
+            'time_steps': time_steps,
+            'wall_time': wall_time,
+            'rows_per_sec': rows / wall_time,
+            'steps_per_sec': time_steps / wall_time}
+
+def run_benchmarks(sizes=BENCHMARK_SIZES, engines=['array'], seeds=[3329], time_steps=get_known('time_steps'), phases=False, verbose=True):
+    results = []
+    for rows in sizes:
+        solution = make_benchmark_solution(rows, time_steps=time_steps)
+        for engine in engines:
+            results.append(bench_evaluation(solution, engine, time_steps=time_steps, size=rows, phases=phases))
+            if verbose:
+                print_result(results[-1])
+    for seed in seeds:
+        results.append(bench_simulation(seed, time_steps))
+        if verbose:
+            print_result(results[-1])
+    return {'environment': {'python': platform.python_version(),
+                            'numpy': np.__version__,
+                            'pandas': pd.__version__,
+                            'machine': platform.machine()},
+            'results': results}
+
+def print_result(result):
+    print(f"{result['name']:<32} {result['rows']:>9} rows {result['wall_time']:>9.3f}s "
+          f"{result['rows_per_sec']:>12.0f} rows/sec {result['steps_per_sec']:>9.2f} steps/sec", file=sys.stderr)
+
+def compare_benchmarks(results, baseline, tolerance=0.2):
+    # THROUGHPUT OF EVERY BENCHMARK AGAINST THE BASELINE. ratio IS rows/sec
+    # OVER THE BASELINE rows/sec AND A BENCHMARK REGRESSES WHEN ratio < 1 - tolerance.
+    base = {r['name']: r for r in baseline['results']}
+    table = []
+    for r in results['results']:
+        b = base.get(r['name'])
+        ratio = r['rows_per_sec'] / b['rows_per_sec'] if b and b['rows_per_sec'] else np.nan
+        table.append({'name': r['name'],
+                      'rows_per_sec': r['rows_per_sec'],
+                      'baseline_rows_per_sec': b['rows_per_sec'] if b else np.nan,
+                      'steps_per_sec': r['steps_per_sec'],
+                      'baseline_steps_per_sec': b['steps_per_sec'] if b else np.nan,
+                      'ratio': ratio,
+                      'regression': bool(ratio < 1 - tolerance),
+                      # THE SAME SOLUTION MUST KEEP ITS OBJECTIVE
+                      'objective_changed': bool(b is not None and 'objective' in r and
+                                                not np.isclose(r['objective'], b['objective'], rtol=1e-9, equal_nan=True))})
+    return pd.DataFrame(table).set_index('name')
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the evaluation and of the Simulation.')
+    parser.add_argument('--sizes', type=int, nargs='*', default=BENCHMARK_SIZES, help='rows of the synthetic solutions')
+    parser.add_argument('--engines', nargs='*', default=['array'], help='evaluation engines')
+    parser.add_argument('--seeds', type=int, nargs='*', default=[3329], help='seeds of the Simulation benchmarks')
+    parser.add_argument('--time-steps', type=int, default=get_known('time_steps'))
+    parser.add_argument('--baseline', help='baseline JSON to compare with')
+    parser.add_argument('--save', help='save the results to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--phases', action='store_true', help='also record the time of every phase, in a separate traced run')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.engines, args.seeds, args.time_steps, args.phases)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        save_json(args.save, results)
+    if args.baseline:
+        table = compare_benchmarks(results, load_json(args.baseline), args.tolerance)
+        print(table.to_string())
+        if table['regression'].any() or table['objective_changed'].any():
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
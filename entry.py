@@ -1,5 +1,9 @@
+import os
+import time
+from contextlib import nullcontext, redirect_stdout
 from seeds import known_seeds
-from utils import save_solution
+from utils import save_solution, get_shared, get_shared_pool
+from solution_writer import get_solution_extension
 import application as app
 from Classes import *
 
@@ -8,14 +12,43 @@ seeds = known_seeds('training')
 
 selected_seed = 8501
 
-for s in seeds:
-    givens = ProblemData()
-    actual_demand = InputDemandDataActual(seed = selected_seed)
-    inventory = Inventory(givens)
-    time_steps_send = 168
-    print(givens)
-    print(actual_demand)
-    print(inventory)
-    solution_json = app.solution_function(givens, actual_demand, seed = s, time_steps=time_steps_send, debugging=True)
-    # SAVE YOUR SOLUTION
-    #save_solution(solution_json, f'{outputdirectory}/{s}.json')
\ No newline at end of file
+'''
+
+Batch generation of the solutions of many seeds.
+
+ProblemData is read-only during a simulation, so it is loaded ONCE in the parent
+process and handed to the workers of the pool. With the 'fork' start method
+(the default on Linux) the workers inherit it from the parent without copying or
+pickling it. Every worker builds its own InputDemandDataActual(seed = s) and its
+own Simulation (with its own Inventory) and writes <seed>.<extension> to the
+output directory.
+
+The Simulation prints a lot. Set verbose = True to see the output of the workers.
+
+'''
+
+def generate_seed(seed, outputdirectory, time_steps=168, output_format='json', verbose=False):
+    # GENERATE THE SOLUTION OF ONE SEED WITH THE SHARED PROBLEM DATA
+    start = time.perf_counter()
+    givens = get_shared('givens') or ProblemData()
+    output_path = os.path.join(outputdirectory, f'{seed}.{get_solution_extension(output_format)}')
+    with open(os.devnull, 'w') as devnull, nullcontext() if verbose else redirect_stdout(devnull):
+        actual_demand = InputDemandDataActual(seed = seed)
+        app.solution_function(givens, actual_demand, seed = seed, time_steps=time_steps, output_path=output_path, output_format=output_format)
+    return {'seed': seed, 'output_path': output_path, 'wall_time': time.perf_counter() - start}
+
+def _generate_seed(args):
+    return generate_seed(*args)
+
+def generate_seeds(seeds, outputdirectory, processes=None, time_steps=168, output_format='json', verbose=False, givens=None):
+    # GENERATE THE SOLUTIONS OF MANY SEEDS IN A PROCESS POOL, ONE SEED PER TASK
+    if givens is None:
+        givens = ProblemData()
+    os.makedirs(outputdirectory, exist_ok=True)
+    tasks = [(seed, outputdirectory, time_steps, output_format, verbose) for seed in seeds]
+    with get_shared_pool(processes, givens=givens) as pool:
+        return pool.map(_generate_seed, tasks, chunksize=1)
+
+if __name__ == '__main__':
+    for result in generate_seeds(seeds, outputdirectory):
+        print(f"Seed {result['seed']}: {result['output_path']} in {result['wall_time']:.1f}s")
\ No newline at end of file
@@ -1,7 +1,11 @@
+import json
 import logging
 import numpy as np
 import pandas as pd
 from scipy.stats import truncweibull_min
+from fleet_engine import FleetState, IncrementalFleetState
+from tracing import NULL_TRACE, get_trace
+from utils import parse_release_times, get_solution_frame, get_table_pivot
 
 # CREATE LOGGER
 logger = logging.getLogger()
@@ -96,6 +100,10 @@ def solution_data_preparation(solution, servers, datacenters, selling_prices):
 
     '''
 
+    # A SOLUTION WITH NO VALID ROW CANNOT BE EVALUATED, evaluation_function
+    # RETURNS None FOR IT
+    if solution.empty:
+        raise(ValueError('The solution has no valid rows.'))
     # ADD PROBLEM DATA
     solution = solution.merge(servers, on='server_generation', how='left')
     solution = solution.merge(datacenters, on='datacenter_id', how='left')
@@ -103,7 +111,7 @@ def solution_data_preparation(solution, servers, datacenters, selling_prices):
                               on=['server_generation', 'latency_sensitivity'], 
                               how='left')
     # CHECK IF SERVERS ARE USED AT THE RIGHT RELEASE TIME
-    solution = check_server_usage_by_release_time(solution)
+    solution = check_server_usage_by_release_time(solution, get_release_times(servers))
     # DROP DUPLICATE SERVERS IDs
     solution = drop_duplicate_server_ids(solution)
     return solution.reset_index(drop=True, inplace=False)
@@ -147,11 +155,25 @@ def check_datacenters_servers_generation(solution):
     solution = solution[solution['server_generation'].isin(known_generations)]
     return solution
 
-def check_server_usage_by_release_time(solution):
+def get_release_times(servers):
+    # RELEASE WINDOWS AS TWO INTEGER ARRAYS (start, end) INDEXED LIKE
+    # get_known('server_generation')
+    servers = parse_release_times(servers)
+    s = servers.set_index('server_generation').reindex(get_known('server_generation'))
+    return s['release_start'].values, s['release_end'].values
+
+def check_server_usage_by_release_time(solution, release_times=None):
     # CHECK THAT ONLY THE SERVERS AVAILABLE FOR PURCHASE AT A CERTAIN TIME-STEP ARE USED AT THAT TIME-STEP
 
     # solution's Dataframe Columns: time_step, datacenter_id, server_generation, server_id, action
-    solution['rt_is_fine'] = solution.apply(check_release_time, axis=1)
+    if release_times is None:
+        solution['rt_is_fine'] = solution.apply(check_release_time, axis=1)
+    else:
+        # ONE VECTORIZED PASS OVER THE time_step COLUMN
+        start, end = release_times
+        g = get_generation_index(solution['server_generation'])
+        ts = solution['time_step'].values
+        solution['rt_is_fine'] = (ts >= start[g]) & (ts <= end[g])
 
     '''
 
@@ -186,7 +208,7 @@ Snippet from the function:
 def check_release_time(x):
     # HELPER FUNCTION TO CHECK THE CORRECT SERVER USAGE BY TIME-STEP
     # solution's Dataframe Columns: time_step, datacenter_id, server_generation, server_id, action
-    rt = eval(x['release_time'])
+    rt = parse_release_time(x['release_time'])
 
     '''
 
@@ -209,6 +231,27 @@ def check_release_time(x):
     else:
         return False
 
+def parse_release_time(release_time):
+    # HELPER FUNCTION TO PARSE A "[start,end]" RELEASE WINDOW WITHOUT eval()
+    return [int(t) for t in release_time.strip('[]').split(',')]
+
+def intern_server_ids(solution):
+    # MAP THE server_id STRINGS TO DENSE int32 HANDLES ONCE, SO THAT THE
+    # DUPLICATE CHECKS, THE FLEET INDEX, THE MOVES AND THE DISMISSALS HASH
+    # SMALL INTEGERS INSTEAD OF LONG STRINGS. server_ids[handle] IS THE
+    # ORIGINAL STRING, ONLY USED IN ERROR REPORTS.
+    codes, server_ids = pd.factorize(solution['server_id'].values, use_na_sentinel=False)
+    solution = solution.assign(server_id=codes.astype(np.int32))
+    return solution, np.asarray(server_ids, dtype=object)
+
+def get_missing_server_ids_error(fleet, handles, server_ids=None):
+    # HELPER FUNCTION TO REPORT THE SERVERS OF handles THAT ARE NOT IN THE
+    # FLEET WITH THEIR server_id STRINGS
+    missing = np.setdiff1d(handles, fleet.index.values)
+    if server_ids is not None:
+        missing = server_ids[missing]
+    return KeyError(f'{list(missing)} not in index')
+
 def drop_duplicate_server_ids(solution):
     # DROP SERVERS THAT ARE BOUGHT MULTIPLE TIMES WITH THE SAME SERVER ID
     drop = solution[(solution['server_id'].duplicated()) & (solution['action'] == 'buy')].index
@@ -233,36 +276,76 @@ Snippet from the function:
 
 def change_selling_prices_format(selling_prices):
     # ADJUST THE FORMAT OF THE SELLING PRICES DATAFRAME TO GET ALONG WITH THE
-    # REST OF CODE
+    # REST OF CODE. THE selling_prices OF load_problem_data USE THE
+    # selling_price_matrix OF THE PROBLEM DATA CACHE INSTEAD OF A PIVOT.
+    matrix = get_table_pivot(selling_prices)
+    if matrix is not None:
+        prices = pd.DataFrame(matrix, index=pd.Index(get_known('server_generation'), name='server_generation'),
+                              columns=pd.Index(get_known('latency_sensitivity'), name='latency_sensitivity'))
+        return prices.sort_index().sort_index(axis=1)
     selling_prices = selling_prices.pivot(index='server_generation', columns='latency_sensitivity')
     selling_prices.columns = selling_prices.columns.droplevel(0)
     return selling_prices
 
 # Dataframe Columns: time_step, datacenter_id, server_generation, server_id, action
 
-def get_actual_demand(demand):
-    # CALCULATE THE ACTUAL DEMAND AT TIME-STEP t
-    actual_demand = []
-    for ls in get_known('latency_sensitivity'):
-        for sg in get_known('server_generation'):
-            d = demand[demand['latency_sensitivity'] == ls]
-            sg_demand = d[sg].values.astype(float)
-            rw = get_random_walk(sg_demand.shape[0], 0, 2)
-            sg_demand += (rw * sg_demand)
-            ls_sg_demand = pd.DataFrame()
-            ls_sg_demand['time_step'] = d['time_step']
-            ls_sg_demand['server_generation'] = sg
-            ls_sg_demand['latency_sensitivity'] = ls
-            ls_sg_demand['demand'] = sg_demand.astype(int)
-            actual_demand.append(ls_sg_demand)
-    actual_demand = pd.concat(actual_demand, axis=0, ignore_index=True)
-    actual_demand = actual_demand.pivot(index=['time_step', 'server_generation'], columns='latency_sensitivity')
-    actual_demand.columns = actual_demand.columns.droplevel(0)
-    actual_demand = actual_demand.loc[actual_demand[get_known('latency_sensitivity')].sum(axis=1) > 0]
-    actual_demand = actual_demand.reset_index(['time_step', 'server_generation'], col_level=1, inplace=False)
-    # if debuggingmode:
-    #     print(actual_demand)
-    return actual_demand
+def get_actual_demand(demand, rng=None):
+    # CALCULATE THE ACTUAL DEMAND AT TIME-STEP t. ALL THE SERVER GENERATION x
+    # LATENCY SENSITIVITY RANDOM WALKS ARE COMPUTED AS ONE MATRIX. THE NORMAL
+    # DRAWS ARE TAKEN IN THE SAME ORDER AS ONE get_random_walk CALL PER PAIR
+    # (LATENCY SENSITIVITY FIRST, THEN SERVER GENERATION).
+    if rng is None:
+        rng = np.random
+    time_steps, base = get_demand_base(demand)
+    rw = get_random_walks(base.shape, 0, 2, rng)
+    return get_actual_demand_frame(time_steps, adjust_demand_by_random_walk(base, rw))
+
+def get_actual_demand_batch(demand, seeds):
+    # CALCULATE THE ACTUAL DEMAND OF MANY SEEDS IN ONE BATCH. RETURNS THE
+    # TIME-STEPS AND AN INTEGER ARRAY OF SHAPE
+    # (seeds, latency sensitivities, server generations, time-steps).
+    # get_actual_demand_frame(time_steps, actual[i]) IS THE SAME AS
+    # get_actual_demand(demand) AFTER np.random.seed(seeds[i]).
+    time_steps, base = get_demand_base(demand)
+    r = np.stack([np.random.RandomState(seed).normal(0, 2, base.shape) for seed in seeds])
+    return time_steps, adjust_demand_by_random_walk(base, normalize_random_walks(np.cumsum(r, axis=-1)))
+
+def get_demand_base(demand):
+    # HELPER FUNCTION TO GET THE DEMAND AS A FLOAT ARRAY OF SHAPE
+    # (latency sensitivities, server generations, time-steps). THE demand OF
+    # load_problem_data USES THE demand_cube OF THE PROBLEM DATA CACHE.
+    cube = get_table_pivot(demand)
+    if cube is not None:
+        return cube
+    blocks = [demand[demand['latency_sensitivity'] == ls] for ls in get_known('latency_sensitivity')]
+    time_steps = blocks[0]['time_step'].values
+    for d in blocks:
+        if not np.array_equal(d['time_step'].values, time_steps):
+            raise(ValueError('The demand must have the same time-steps for every latency sensitivity.'))
+    base = np.stack([d[get_known('server_generation')].values.astype(float).T for d in blocks])
+    return time_steps, base
+
+def adjust_demand_by_random_walk(base, rw):
+    # HELPER FUNCTION TO CHANGE THE DEMAND PATTERN WITH THE RANDOM WALKS
+    return (base + (rw * base)).astype(int)
+
+def get_actual_demand_frame(time_steps, actual):
+    # HELPER FUNCTION TO BUILD THE PIVOTED ACTUAL DEMAND FROM AN ARRAY OF
+    # SHAPE (latency sensitivities, server generations, time-steps): ONE ROW
+    # PER (time_step, server_generation) WITH SOME DEMAND, ONE COLUMN PER
+    # LATENCY SENSITIVITY
+    latency_sensitivities = np.array(get_known('latency_sensitivity'))
+    server_generations = np.array(get_known('server_generation'))
+    ls_order = np.argsort(latency_sensitivities)
+    sg_order = np.argsort(server_generations)
+    ts_order = np.argsort(time_steps, kind='stable')
+    values = actual[ls_order][:, sg_order][:, :, ts_order].transpose(2, 1, 0)
+    values = values.reshape(-1, len(latency_sensitivities))
+    actual_demand = pd.DataFrame(values, columns=pd.Index(latency_sensitivities[ls_order], name='latency_sensitivity'))
+    actual_demand.insert(0, 'server_generation', np.tile(server_generations[sg_order], len(time_steps)))
+    actual_demand.insert(0, 'time_step', np.repeat(time_steps[ts_order], len(server_generations)))
+    actual_demand = actual_demand.loc[values.sum(axis=1) > 0]
+    return actual_demand.reset_index(drop=True, inplace=False)
 
 def get_random_walk(n, mu, sigma):
     # HELPER FUNCTION TO GET A RANDOM WALK TO CHANGE THE DEMAND PATTERN
@@ -274,13 +357,20 @@ def get_random_walk(n, mu, sigma):
     The Seed was set according to "seed" from the <seed>.json passed in from the evaluation_function function.
 
     '''
-    r = np.random.normal(mu, sigma, n)
-    ts = np.empty(n)
-    ts[0] = r[0]
-    for i in range(1, n):
-        ts[i] = ts[i - 1] + r[i]
-    ts = (2 * (ts - ts.min()) / np.ptp(ts)) - 1
-    return ts
+    return get_random_walks(n, mu, sigma)
+
+def get_random_walks(shape, mu, sigma, rng=None):
+    # HELPER FUNCTION TO GET MANY RANDOM WALKS AT ONCE, ONE ALONG THE LAST AXIS
+    # OF EVERY ROW. np.cumsum ADDS THE STEPS ONE AFTER THE OTHER, SO EVERY
+    # WALK IS THE SAME AS THE ONE BUILT WITH A LOOP.
+    if rng is None:
+        rng = np.random
+    r = rng.normal(mu, sigma, shape)
+    return normalize_random_walks(np.cumsum(r, axis=-1))
+
+def normalize_random_walks(ts):
+    # HELPER FUNCTION TO SCALE EVERY RANDOM WALK TO [-1, 1]
+    return (2 * (ts - ts.min(axis=-1, keepdims=True)) / np.ptp(ts, axis=-1, keepdims=True)) - 1
 
 def get_time_step_demand(demand, ts):
     # GET THE DEMAND AT A SPECIFIC TIME-STEP t
@@ -289,10 +379,28 @@ def get_time_step_demand(demand, ts):
     d = d.drop(columns='time_step', inplace=False)
     return d
 
-def get_time_step_fleet(solution, ts):
-    # GET THE SOLUTION AT A SPECIFIC TIME-STEP 
-    if ts in solution['time_step'].values:
+def get_time_step_index(solution, time_steps=get_known('time_steps')):
+    # GROUP THE SOLUTION BY TIME-STEP ONCE. THE SOLUTION IS SORTED BY
+    # time_step (STABLE, SO THE ROWS OF A TIME-STEP KEEP THEIR ORDER) AND THE
+    # ROWS OF TIME-STEP ts ARE solution.iloc[offsets[0][ts]:offsets[1][ts]]
+    solution = solution.sort_values('time_step', kind='stable', ignore_index=True)
+    ts = solution['time_step'].values
+    steps = np.arange(time_steps + 1)
+    offsets = np.stack([np.searchsorted(ts, steps, side='left'),
+                        np.searchsorted(ts, steps, side='right')])
+    return solution, offsets
+
+def get_time_step_fleet(solution, ts, offsets=None):
+    # GET THE SOLUTION AT A SPECIFIC TIME-STEP. WITH THE offsets OF
+    # get_time_step_index ONLY THE ROWS OF THE TIME-STEP ARE TOUCHED.
+    if offsets is not None:
+        start, end = offsets[:, ts]
+        s = solution.iloc[start:end] if end > start else None
+    elif ts in solution['time_step'].values:
         s = solution[solution['time_step'] == ts]
+    else:
+        s = None
+    if s is not None:
         s = s.drop_duplicates('server_id', inplace=False)
         s = s.set_index('server_id', drop=False, inplace=False)
         s = s.drop(columns='time_step', inplace=False)
@@ -300,14 +408,27 @@ def get_time_step_fleet(solution, ts):
     else:
         return pd.DataFrame()
 
-def get_capacity_by_server_generation_latency_sensitivity(fleet):
+def get_capacity_by_server_generation_latency_sensitivity(fleet, sampler=None, ts=None):
     # CALCULATE THE CAPACITY AT A SPECIFIC TIME-STEP t FOR ALL PAIRS OF
     # LATENCY SENSITIVITIES AND SERVER GENERATIONS. ADJUST SUCH CAPACITY
     # ACCORDING TO THE FAILURE RATE f.
     Z = fleet.groupby(by=['server_generation', 'latency_sensitivity'])['capacity'].sum().unstack()
+    return adjust_capacity(Z, sampler, ts)
+
+def adjust_capacity(Z, sampler=None, ts=None):
+    # HELPER FUNCTION TO APPLY THE FAILURE RATE f TO THE CAPACITY OF THE
+    # PAIRS PRESENT IN THE FLEET (THE OTHER CELLS OF Z ARE NaN). WITHOUT A
+    # FailureRateSampler EVERY CELL DRAWS ITS OWN f.
     cols = get_valid_columns(Z.columns, get_known('latency_sensitivity'))
     Z = Z[cols]
-    Z = Z.map(adjust_capacity_by_failure_rate, na_action='ignore')
+    if sampler is None:
+        Z = Z.map(adjust_capacity_by_failure_rate, na_action='ignore')
+    else:
+        z = Z.values.astype(float)
+        present = ~np.isnan(z)
+        f = sampler.get_failure_rates(ts, Z.index, Z.columns, present)
+        z[present] = np.trunc(z[present] * 1 - f[present])
+        Z = pd.DataFrame(z, index=Z.index, columns=Z.columns)
     Z = Z.fillna(0, inplace=False)
     return Z
 
@@ -319,36 +440,102 @@ def adjust_capacity_by_failure_rate(x):
     # HELPER FUNCTION TO CALCULATE THE FAILURE RATE f
     return int(x * 1 - truncweibull_min.rvs(0.3, 0.05, 0.1, size=1).item())
 
-def check_datacenter_slots_size_constraint(fleet):
+class FailureRateSampler:
+    """
+    Draws the failure rates f of a whole evaluation with a single
+    truncweibull_min.rvs call, instead of one call per cell and time-step.
+
+    mode='reproducible' draws time_steps x 21 samples up front and hands them
+    out in the order in which adjust_capacity_by_failure_rate draws them
+    (column by column over the present cells of Z, one time-step after the
+    other), so for a given seed every cell gets the same f as before.
+
+    mode='tensor' pre-generates a (time_steps x server generations x latency
+    sensitivities) tensor and every cell reads the sample of its own
+    (time-step, generation, sensitivity). It does not depend on which cells
+    are present, but the values differ from the per-cell draws.
+    """
+
+    def __init__(self, time_steps=get_known('time_steps'), mode='reproducible', random_state=None):
+        if mode not in ['reproducible', 'tensor']:
+            raise(ValueError(f'Unknown failure rate sampling mode: {mode}.'))
+        self.mode = mode
+        shape = (time_steps,
+                 len(get_known('server_generation')),
+                 len(get_known('latency_sensitivity')))
+        self.samples = truncweibull_min.rvs(0.3, 0.05, 0.1, size=shape, random_state=random_state)
+        self.position = 0
+
+    def get_failure_rates(self, ts, server_generations, latency_sensitivities, present):
+        # FAILURE RATES FOR THE CELLS OF Z WHERE present IS TRUE
+        if self.mode == 'reproducible':
+            n = present.sum()
+            f = np.full(present.shape, np.nan)
+            # COLUMN-MAJOR, LIKE DataFrame.map
+            f.T[present.T] = self.samples.ravel()[self.position:self.position + n]
+            self.position += n
+            return f
+        g = get_generation_index(server_generations)
+        ls = get_latency_sensitivity_index(latency_sensitivities)
+        return self.samples[ts - 1][np.ix_(g, ls)]
+
+class SlotsConstraintViolation(ValueError):
+    """
+    Constraint 2 violation. report has the time-step and, for every datacenter
+    over its capacity, the number of servers, the used slots and the
+    slots_capacity they were compared with.
+    """
+
+    def __init__(self, ts, datacenters):
+        self.report = {'constraint': 2, 'time_step': ts, 'datacenters': datacenters}
+        details = '; '.join(f"{d['datacenter_id']} uses {d['used_slots']} slots of {d['slots_capacity']} ({d['servers']} servers)" for d in datacenters)
+        super().__init__(f'Constraint 2 has been violated at time-step {ts}: {details}.')
+
+def get_slots_violations(datacenter_ids, servers, used_slots, slots_capacity):
+    # HELPER FUNCTION TO LIST THE DATACENTERS WHOSE USED SLOTS ARE OVER THEIR
+    # slots_capacity
+    return [{'datacenter_id': dc, 'servers': int(n), 'used_slots': int(used), 'slots_capacity': float(capacity)}
+            for dc, n, used, capacity in zip(datacenter_ids, servers, used_slots, slots_capacity)
+            if used > capacity]
+
+def check_datacenter_slots_size_constraint(fleet, ts=None):
     # CHECK DATACENTERS SLOTS SIZE CONSTRAINT
     slots = fleet.groupby(by=['datacenter_id']).agg({'slots_size': 'sum',
                                                         'slots_capacity': 'mean'})
     test = slots['slots_size'] > slots['slots_capacity']
     constraint = test.any()
     if constraint:
-        raise(ValueError('Constraint 2 has been violated.'))
+        servers = fleet['datacenter_id'].value_counts().reindex(slots.index)
+        raise(SlotsConstraintViolation(ts, get_slots_violations(slots.index, servers, slots['slots_size'], slots['slots_capacity'])))
 
 def get_utilization(D, Z):
     # CALCULATE OBJECTIVE U = UTILIZATION
-    u = []
-    server_generations = Z.index
-    latency_sensitivities = Z.columns
-    for server_generation in server_generations:
-        for latency_sensitivity in latency_sensitivities:
-            z_ig = Z[latency_sensitivity].get(server_generation, default=0)
-            d_ig = D[latency_sensitivity].get(server_generation, default=0)
-            if (z_ig > 0) and (d_ig > 0):
-                u.append(min(z_ig, d_ig) / z_ig)
-            elif (z_ig == 0) and (d_ig == 0):
-                continue
-            elif (z_ig > 0) and (d_ig == 0):
-                u.append(0)
-            elif (z_ig == 0) and (d_ig > 0):
-                continue
-    if u:
-        return sum(u) / len(u)
-    else:
-        return 0
+    return get_utilization_and_revenue(D, Z)[0]
+
+def get_utilization_and_revenue(D, Z, selling_prices=None):
+    # CALCULATE U AND THE REVENUE IN ONE PASS OVER THE CELLS OF Z. D AND THE
+    # SELLING PRICES ARE ALIGNED TO Z (MISSING CELLS ARE 0) AND min(z, d) IS
+    # SHARED BY BOTH TERMS. A CELL COUNTS IN U WHEN z > 0 AND d >= 0, WITH
+    # min(z, d) / z (0 WHEN d == 0). THE SUMS ARE TAKEN IN THE ORDER OF THE
+    # CELLS (GENERATION BY GENERATION) LIKE THE ORIGINAL LOOPS.
+    z, d, p = get_aligned_arrays(Z, D, selling_prices)
+    m = np.fmin(z, d)
+    used = (z > 0) & (d >= 0)
+    u = (m[used] / z[used]).tolist()
+    U = sum(u) / len(u) if u else 0
+    R = sum((m * p).ravel().tolist(), 0) if p is not None else None
+    return U, R
+
+def get_aligned_arrays(Z, *frames):
+    # HELPER FUNCTION TO GET THE VALUES OF Z AND OF THE OTHER FRAMES ON THE
+    # CELLS OF Z (0 WHERE A FRAME HAS NO SUCH CELL)
+    arrays = [Z.values]
+    for frame in frames:
+        if frame is None:
+            arrays.append(None)
+        else:
+            arrays.append(frame.reindex(index=Z.index, columns=Z.columns, fill_value=0).values)
+    return arrays
 
 def get_normalized_lifespan(fleet):
     # CALCULATE OBJECTIVE L = NORMALIZED LIFESPAN
@@ -362,22 +549,52 @@ def get_profit(D, Z, selling_prices, fleet):
 
 def get_revenue(D, Z, selling_prices):
     # CALCULATE THE REVENUE
-    r = 0
-    server_generations = Z.index
-    latency_sensitivities = Z.columns
-    for server_generation in server_generations:
-        for latency_sensitivity in latency_sensitivities:
-            z_ig = Z[latency_sensitivity].get(server_generation, default=0)
-            d_ig = D[latency_sensitivity].get(server_generation, default=0)
-            p_ig = selling_prices[latency_sensitivity].get(server_generation, default=0)
-            r += min(z_ig, d_ig) * p_ig
-    return r
-
-def get_cost(fleet):
-    # CALCULATE THE COST
-    fleet['cost'] = fleet.apply(calculate_server_cost, axis=1)
+    return get_utilization_and_revenue(D, Z, selling_prices)[1]
+
+def get_cost(fleet, breakdown=False):
+    # CALCULATE THE COST. WITH breakdown=True ALSO RETURN THE COST BY SERVER
+    # GENERATION AND BY DATACENTER, COMPUTED FROM THE SAME PASS.
+    costs = calculate_server_costs(fleet['purchase_price'].values,
+                                   fleet['average_maintenance_fee'].values,
+                                   fleet['lifespan'].values,
+                                   fleet['life_expectancy'].values,
+                                   fleet['energy_consumption'].values,
+                                   fleet['cost_of_energy'].values,
+                                   fleet['moved'].values,
+                                   fleet['cost_of_moving'].values)
+    fleet['cost'] = costs['cost']
+    if breakdown:
+        return fleet['cost'].sum(), get_cost_breakdown(costs,
+                                                       get_generation_index(fleet['server_generation']),
+                                                       get_datacenter_index(fleet['datacenter_id']))
     return fleet['cost'].sum()
 
+def calculate_server_costs(r, b, x, xhat, energy_consumption, cost_of_energy, moved, cost_of_moving):
+    # BATCHED VERSION OF calculate_server_cost: EACH ARGUMENT IS A COLUMN WITH
+    # ONE VALUE PER SERVER. RETURNS THE COST COMPONENTS AND THE TOTAL COST OF
+    # EVERY SERVER.
+    x = np.asarray(x)
+    costs = {'energy': energy_consumption * cost_of_energy,
+             'maintenance': get_maintenance_cost(b, x, xhat),
+             'purchase': np.where(x == 1, r, 0),
+             'moving': np.where((x != 1) & (np.asarray(moved) == 1), cost_of_moving, 0)}
+    # ONLY ONE OF purchase AND moving IS CHARGED, SO THE TOTAL IS SUMMED IN THE
+    # SAME ORDER AS calculate_server_cost
+    costs['cost'] = costs['energy'] + costs['maintenance'] + (costs['purchase'] + costs['moving'])
+    return costs
+
+def get_cost_breakdown(costs, generations, datacenters):
+    # SUM THE COST COMPONENTS BY SERVER GENERATION AND BY DATACENTER.
+    # generations AND datacenters ARE THE INDICES RETURNED BY
+    # get_generation_index AND get_datacenter_index.
+    breakdown = {}
+    for key, codes in [('server_generation', generations), ('datacenter_id', datacenters)]:
+        labels = get_known(key)
+        breakdown[key] = pd.DataFrame({c: np.bincount(codes, weights=v, minlength=len(labels))
+                                       for c, v in costs.items()},
+                                      index=pd.Index(labels, name=key))
+    return breakdown
+
 def calculate_server_cost(row):
     c = 0
     r = row['purchase_price']
@@ -397,7 +614,7 @@ def calculate_server_cost(row):
 def get_maintenance_cost(b, x, xhat):
     return b * (1 + (((1.5)*(x))/xhat * np.log2(((1.5)*(x))/xhat)))
 
-def update_fleet(ts, fleet, solution):
+def update_fleet(ts, fleet, solution, server_ids=None):
     if fleet.empty:
         fleet = solution.copy()
         fleet['lifespan'] = 0
@@ -410,13 +627,19 @@ def update_fleet(ts, fleet, solution):
         # MOVE
         if 'move' in server_id_action:
             s = server_id_action['move']
-            fleet.loc[s, 'datacenter_id'] = solution.loc[s, 'datacenter_id']
+            try:
+                fleet.loc[s, 'datacenter_id'] = solution.loc[s, 'datacenter_id']
+            except KeyError:
+                raise(get_missing_server_ids_error(fleet, s, server_ids))
             fleet.loc[s, 'moved'] = 1
         # HOLD
             # do nothing
         # DISMISS
         if 'dismiss' in server_id_action:
-            fleet = fleet.drop(index=server_id_action['dismiss'], inplace=False)
+            try:
+                fleet = fleet.drop(index=server_id_action['dismiss'], inplace=False)
+            except KeyError:
+                raise(get_missing_server_ids_error(fleet, server_id_action['dismiss'], server_ids))
     fleet = update_check_lifespan(fleet)
     return fleet
 
@@ -430,21 +653,318 @@ def update_check_lifespan(fleet):
     fleet = fleet.drop(fleet.index[fleet['lifespan'] >= fleet['life_expectancy']], inplace=False)
     return fleet
 
+def get_fleet_tables(servers, datacenters):
+    # LOOKUP TABLES OF THE SERVERS AND DATACENTERS DATA, INDEXED LIKE
+    # get_known('server_generation') AND get_known('datacenter_id')
+    s = servers.set_index('server_generation').reindex(get_known('server_generation'))
+    dc = datacenters.set_index('datacenter_id').reindex(get_known('datacenter_id'))
+    tables = {col: s[col].values for col in ['capacity',
+                                             'slots_size',
+                                             'life_expectancy',
+                                             'purchase_price',
+                                             'energy_consumption',
+                                             'cost_of_moving',
+                                             'average_maintenance_fee']}
+    tables['release_start'], tables['release_end'] = get_release_times(servers)
+    tables['cost_of_energy'] = dc['cost_of_energy'].values
+    tables['slots_capacity'] = dc['slots_capacity'].values
+    tables['latency_sensitivity'] = get_latency_sensitivity_index(dc['latency_sensitivity'])
+    return tables
+
+def get_generation_index(values):
+    # MAP SERVER GENERATIONS TO INDICES INTO get_known('server_generation')
+    return pd.Categorical(values, categories=get_known('server_generation')).codes
+
+def get_datacenter_index(values):
+    # MAP DATACENTER IDS TO INDICES INTO get_known('datacenter_id')
+    return pd.Categorical(values, categories=get_known('datacenter_id')).codes
+
+def get_latency_sensitivity_index(values):
+    # MAP LATENCY SENSITIVITIES TO INDICES INTO get_known('latency_sensitivity')
+    return pd.Categorical(values, categories=get_known('latency_sensitivity')).codes
+
+def update_fleet_arrays(fleet, solution):
+    # SAME AS update_fleet FOR A FleetState: BUY, MOVE, DISMISS AND AGING ARE
+    # MASK UPDATES OVER THE FLEET COLUMNS
+    if not solution.empty:
+        server_ids = solution['server_id'].values
+        actions = solution['action'].values
+        generations = get_generation_index(solution['server_generation'])
+        datacenters = get_datacenter_index(solution['datacenter_id'])
+        if fleet.empty:
+            fleet.add(server_ids, generations, datacenters)
+        else:
+            # BUY
+            m = actions == 'buy'
+            if m.any():
+                fleet.add(server_ids[m], generations[m], datacenters[m])
+            # MOVE
+            m = actions == 'move'
+            if m.any():
+                fleet.move(server_ids[m], datacenters[m])
+            # HOLD
+                # do nothing
+            # DISMISS
+            m = actions == 'dismiss'
+            if m.any():
+                fleet.dismiss(server_ids[m])
+    fleet.age()
+    return fleet
+
+def get_capacity_arrays(fleet, tables, sampler=None, ts=None):
+    # SAME AS get_capacity_by_server_generation_latency_sensitivity FOR A
+    # FleetState. THE LATENCY SENSITIVITY IS THE ONE OF THE HOME DATACENTER.
+    generations = get_known('server_generation')
+    latency_sensitivities = get_known('latency_sensitivity')
+    rows = fleet.rows()
+    g = fleet.generation[rows]
+    cells = g * len(latency_sensitivities) + tables['latency_sensitivity'][fleet.home[rows]]
+    shape = (len(generations), len(latency_sensitivities))
+    n = np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape)
+    z = np.bincount(cells, weights=tables['capacity'][g], minlength=shape[0] * shape[1]).reshape(shape)
+    return get_capacity_frame(n, z, sampler, ts)
+
+def get_capacity_frame(n, z, sampler=None, ts=None):
+    # HELPER FUNCTION TO TURN THE (generation x latency sensitivity) SERVER
+    # COUNTS n AND CAPACITIES z INTO THE CAPACITY DataFrame Z OF THE PANDAS
+    # EVALUATOR AND APPLY THE FAILURE RATE
+    generations = get_known('server_generation')
+    latency_sensitivities = get_known('latency_sensitivity')
+    z = z.astype(float)
+    z[n == 0] = np.nan
+    gs = n.sum(axis=1) > 0
+    ls = n.sum(axis=0) > 0
+    Z = pd.DataFrame(z[gs][:, ls], 
+                     index=pd.Index(np.array(generations)[gs], name='server_generation'), 
+                     columns=pd.Index(np.array(latency_sensitivities)[ls], name='latency_sensitivity'))
+    # SAME COLUMN ORDER AS THE UNSTACKED GROUPBY
+    Z = Z[sorted(Z.columns)]
+    return adjust_capacity(Z, sampler, ts)
+
+def check_datacenter_slots_size_constraint_arrays(fleet, ts=None):
+    # SAME AS check_datacenter_slots_size_constraint FOR A FleetState. THE
+    # SLOT USAGE BY DATACENTER IS KEPT UP TO DATE BY THE FleetState, SO THE
+    # CHECK ONLY COMPARES A FEW NUMBERS.
+    n, slots_size, slots_capacity = fleet.get_slots()
+    used = n > 0
+    capacity = slots_capacity / np.maximum(n, 1)
+    if (slots_size[used] > capacity[used]).any():
+        datacenter_ids = np.array(get_known('datacenter_id'))[used]
+        raise(SlotsConstraintViolation(ts, get_slots_violations(datacenter_ids, n[used], slots_size[used], capacity[used])))
+
+def get_normalized_lifespan_arrays(fleet, tables):
+    # SAME AS get_normalized_lifespan FOR A FleetState
+    rows = fleet.rows()
+    xhat = tables['life_expectancy'][fleet.generation[rows]]
+    return (fleet.lifespan[rows] / xhat).sum() / rows.shape[0]
+
+def get_cost_arrays(fleet, tables, breakdown=False):
+    # SAME AS get_cost FOR A FleetState
+    rows = fleet.rows()
+    g = fleet.generation[rows]
+    costs = calculate_server_costs(tables['purchase_price'][g],
+                                   tables['average_maintenance_fee'][g],
+                                   fleet.lifespan[rows],
+                                   tables['life_expectancy'][g],
+                                   tables['energy_consumption'][g],
+                                   tables['cost_of_energy'][fleet.home[rows]],
+                                   fleet.moved[rows],
+                                   tables['cost_of_moving'][g])
+    if breakdown:
+        return costs['cost'].sum(), get_cost_breakdown(costs, g, fleet.datacenter[rows])
+    return costs['cost'].sum()
+
+def get_evaluation_arrays(solution,
+                          demand,
+                          datacenters,
+                          servers,
+                          selling_prices,
+                          time_steps=get_known('time_steps'),
+                          verbose=1,
+                          sampler=None,
+                          offsets=None,
+                          server_ids=None,
+                          trace=NULL_TRACE):
+
+    # SOLUTION EVALUATION ON A FleetState. solution, demand AND selling_prices
+    # ARE ALREADY PREPARED BY get_evaluation; THE server_id COLUMN HOLDS THE
+    # HANDLES OF intern_server_ids AND server_ids THEIR STRINGS.
+    if offsets is None:
+        solution, offsets = get_time_step_index(solution, time_steps)
+    tables = get_fleet_tables(servers, datacenters)
+    OBJECTIVE = 0
+    FLEET = FleetState(solution.shape[0], tables['life_expectancy'], tables['slots_size'], tables['slots_capacity'], server_ids)
+    for ts in range(1, time_steps+1):
+
+        # GET THE ACTUAL DEMAND AT TIMESTEP ts
+        with trace.span('time_step_demand', ts):
+            D = get_time_step_demand(demand, ts)
+
+        # GET THE SERVERS DEPLOYED AT TIMESTEP ts
+        with trace.span('time_step_fleet', ts):
+            ts_fleet = get_time_step_fleet(solution, ts, offsets)
+
+        if ts_fleet.empty and FLEET.empty:
+            continue
+
+        # UPDATE FLEET
+        with trace.span('update_fleet', ts):
+            FLEET = update_fleet_arrays(FLEET, ts_fleet)
+
+        # CHECK IF THE FLEET IS EMPTY
+        if not FLEET.empty:
+            # GET THE SERVERS CAPACITY AT TIMESTEP ts
+            with trace.span('capacity', ts):
+                Zf = get_capacity_arrays(FLEET, tables, sampler, ts)
+
+            # CHECK CONSTRAINTS
+            with trace.span('constraint', ts):
+                check_datacenter_slots_size_constraint_arrays(FLEET, ts)
+
+            # EVALUATE THE OBJECTIVE FUNCTION AT TIMESTEP ts
+            with trace.span('objective', ts):
+                U, R = get_utilization_and_revenue(D, Zf, selling_prices)
+
+                L = get_normalized_lifespan_arrays(FLEET, tables)
+
+                P = R - get_cost_arrays(FLEET, tables)
+            o = U * L * P
+            OBJECTIVE += o
+
+            # PREPARE OUTPUT
+            output = {'time-step': ts,
+                      'O': round(OBJECTIVE, 2),
+                      'U': round(U, 2),
+                      'L': round(L, 2),
+                      'P': round(P, 2)}
+        else:
+            # PREPARE OUTPUT
+            output = {'time-step': ts,
+                      'O': np.nan,
+                      'U': np.nan,
+                      'L': np.nan,
+                      'P': np.nan}
+
+        trace.step(ts, FLEET.count)
+
+        if verbose:
+            print(output)
+
+    return OBJECTIVE
+
+def get_evaluation_incremental(solution,
+                               demand,
+                               datacenters,
+                               servers,
+                               selling_prices,
+                               time_steps=get_known('time_steps'),
+                               verbose=1,
+                               sampler=None,
+                               offsets=None,
+                               server_ids=None,
+                               trace=NULL_TRACE):
+
+    # SOLUTION EVALUATION ON AN IncrementalFleetState: A TIME-STEP ONLY
+    # TOUCHES THE SERVERS OF ITS ACTIONS AND OF THE EXPIRED COHORTS, THE
+    # OBJECTIVE TERMS ARE READ FROM THE RUNNING COUNTERS. solution, demand AND
+    # selling_prices ARE ALREADY PREPARED BY get_evaluation, WITH THE
+    # server_id HANDLES OF intern_server_ids.
+    if offsets is None:
+        solution, offsets = get_time_step_index(solution, time_steps)
+    tables = get_fleet_tables(servers, datacenters)
+    OBJECTIVE = 0
+    FLEET = IncrementalFleetState(solution.shape[0], tables, time_steps, server_ids)
+    for ts in range(1, time_steps+1):
+
+        # GET THE ACTUAL DEMAND AT TIMESTEP ts
+        with trace.span('time_step_demand', ts):
+            D = get_time_step_demand(demand, ts)
+
+        # GET THE SERVERS DEPLOYED AT TIMESTEP ts
+        with trace.span('time_step_fleet', ts):
+            ts_fleet = get_time_step_fleet(solution, ts, offsets)
+
+        if ts_fleet.empty and FLEET.empty:
+            continue
+
+        # UPDATE FLEET
+        with trace.span('update_fleet', ts):
+            FLEET = update_fleet_arrays(FLEET, ts_fleet)
+
+        # CHECK IF THE FLEET IS EMPTY
+        if not FLEET.empty:
+            # GET THE SERVERS CAPACITY AT TIMESTEP ts
+            with trace.span('capacity', ts):
+                n = FLEET.get_capacity_counts()
+                Zf = get_capacity_frame(n, n * tables['capacity'][:, None], sampler, ts)
+
+            # CHECK CONSTRAINTS
+            with trace.span('constraint', ts):
+                check_datacenter_slots_size_constraint_arrays(FLEET, ts)
+
+            # EVALUATE THE OBJECTIVE FUNCTION AT TIMESTEP ts
+            with trace.span('objective', ts):
+                U, R = get_utilization_and_revenue(D, Zf, selling_prices)
+
+                L = FLEET.get_normalized_lifespan()
+
+                P = R - FLEET.get_cost()
+            o = U * L * P
+            OBJECTIVE += o
+
+            # PREPARE OUTPUT
+            output = {'time-step': ts,
+                      'O': round(OBJECTIVE, 2),
+                      'U': round(U, 2),
+                      'L': round(L, 2),
+                      'P': round(P, 2)}
+        else:
+            # PREPARE OUTPUT
+            output = {'time-step': ts,
+                      'O': np.nan,
+                      'U': np.nan,
+                      'L': np.nan,
+                      'P': np.nan}
+
+        trace.step(ts, FLEET.count)
+
+        if verbose:
+            print(output)
+
+    return OBJECTIVE
+
+def check_engine(engine):
+    # CHECK THAT engine IS ONE OF THE EVALUATION ENGINES
+    if engine not in ['pandas', 'array', 'incremental']:
+        raise(ValueError(f'Unknown evaluation engine: {engine}.'))
+
 def get_evaluation(solution, 
                    demand,
                    datacenters,
                    servers,
                    selling_prices,
                    time_steps=get_known('time_steps'), 
-                   verbose=1):
+                   verbose=1,
+                   engine='pandas',
+                   failure_sampling='reproducible',
+                   rng=None,
+                   trace=NULL_TRACE):
 
     # SOLUTION EVALUATION
+    check_engine(engine)
     
     # SOLUTION DATA PREPARATION
-    solution = solution_data_preparation(solution, 
-                                         servers, 
-                                         datacenters, 
-                                         selling_prices)
+    with trace.span('solution_data_preparation'):
+        # SERVER IDS AS int32 HANDLES FROM HERE ON
+        if isinstance(solution, dict):
+            server_ids = np.asarray(solution['labels']['server_id'], dtype=object)
+            solution = get_solution_frame(solution, intern_server_ids=True)
+        else:
+            solution, server_ids = intern_server_ids(check_data_format(solution))
+        solution = solution_data_preparation(solution, 
+                                             servers, 
+                                             datacenters, 
+                                             selling_prices)
 
     selling_prices = change_selling_prices_format(selling_prices)
 
@@ -455,7 +975,8 @@ def get_evaluation(solution,
         print(demand)
 
     # DEMAND DATA PREPARATION
-    demand = get_actual_demand(demand)
+    with trace.span('get_actual_demand'):
+        demand = get_actual_demand(demand, rng)
 
     if (debuggingmode):
         print("Solution after getting the actual demand")
@@ -463,16 +984,52 @@ def get_evaluation(solution,
         print("Demand after getting the actual demand")
         print(demand)
 
+    # FAILURE RATES OF ALL TIME-STEPS, DRAWN AFTER THE DEMAND
+    with trace.span('failure_rates'):
+        sampler = FailureRateSampler(time_steps, mode=failure_sampling, random_state=rng)
+
+    # GROUP THE SOLUTION BY TIME-STEP
+    with trace.span('time_step_index'):
+        solution, offsets = get_time_step_index(solution, time_steps)
+
+    if engine == 'incremental':
+        return get_evaluation_incremental(solution,
+                                          demand,
+                                          datacenters,
+                                          servers,
+                                          selling_prices,
+                                          time_steps=time_steps,
+                                          verbose=verbose,
+                                          sampler=sampler,
+                                          offsets=offsets,
+                                          server_ids=server_ids,
+                                          trace=trace)
+
+    if engine == 'array':
+        return get_evaluation_arrays(solution,
+                                     demand,
+                                     datacenters,
+                                     servers,
+                                     selling_prices,
+                                     time_steps=time_steps,
+                                     verbose=verbose,
+                                     sampler=sampler,
+                                     offsets=offsets,
+                                     server_ids=server_ids,
+                                     trace=trace)
+
     OBJECTIVE = 0
     FLEET = pd.DataFrame()
     # if ts-related fleet is empty then current fleet is ts-fleet
     for ts in range(1, time_steps+1):
 
         # GET THE ACTUAL DEMAND AT TIMESTEP ts
-        D = get_time_step_demand(demand, ts)
+        with trace.span('time_step_demand', ts):
+            D = get_time_step_demand(demand, ts)
 
         # GET THE SERVERS DEPLOYED AT TIMESTEP ts
-        ts_fleet = get_time_step_fleet(solution, ts)
+        with trace.span('time_step_fleet', ts):
+            ts_fleet = get_time_step_fleet(solution, ts, offsets)
 
         if ts_fleet.empty and not FLEET.empty:
             ts_fleet = FLEET
@@ -480,25 +1037,29 @@ def get_evaluation(solution,
             continue
 
         # UPDATE FLEET
-        FLEET = update_fleet(ts, FLEET, ts_fleet)
+        with trace.span('update_fleet', ts):
+            FLEET = update_fleet(ts, FLEET, ts_fleet, server_ids)
   
         # CHECK IF THE FLEET IS EMPTY
         if FLEET.shape[0] > 0:
             # GET THE SERVERS CAPACITY AT TIMESTEP ts
-            Zf = get_capacity_by_server_generation_latency_sensitivity(FLEET)
+            with trace.span('capacity', ts):
+                Zf = get_capacity_by_server_generation_latency_sensitivity(FLEET, sampler, ts)
     
             # CHECK CONSTRAINTS
-            check_datacenter_slots_size_constraint(FLEET)
+            with trace.span('constraint', ts):
+                check_datacenter_slots_size_constraint(FLEET, ts)
     
             # EVALUATE THE OBJECTIVE FUNCTION AT TIMESTEP ts
-            U = get_utilization(D, Zf)
+            with trace.span('objective', ts):
+                U = get_utilization(D, Zf)
     
-            L = get_normalized_lifespan(FLEET)
+                L = get_normalized_lifespan(FLEET)
     
-            P = get_profit(D, 
-                            Zf, 
-                            selling_prices,
-                            FLEET)
+                P = get_profit(D, 
+                                Zf, 
+                                selling_prices,
+                                FLEET)
             o = U * L * P
             OBJECTIVE += o
             
@@ -519,6 +1080,8 @@ def get_evaluation(solution,
                       'L': np.nan,
                       'P': np.nan}
 
+        trace.step(ts, FLEET.shape[0])
+
         if verbose:
             print(output)
 
@@ -532,7 +1095,13 @@ def evaluation_function(solution,
                         time_steps=get_known('time_steps'), 
                         seed=None,
                         verbose=0,
-                        debugging=False):
+                        debugging=False,
+                        engine='pandas',
+                        failure_sampling='reproducible',
+                        rng=None,
+                        trace=None,
+                        trace_format='jsonl',
+                        report=None):
     
     global debuggingmode
     debuggingmode = debugging
@@ -544,6 +1113,7 @@ def evaluation_function(solution,
     ----------
     solution : pandas DataFrame
         This is a solution to the problem. This is provided by the partecipant.
+        The columns of utils.load_solution_columns are accepted as well.
     demand : pandas DataFrame
         This is the demand data. This is provided by default in the data 
         folder.
@@ -562,6 +1132,35 @@ def evaluation_function(solution,
     c1_max_violations : int
         This is the maximum number of violations to Contraint 1 that can be
         tolerated. If this number is exceeded the function will output None.
+    engine : str
+        'pandas' evaluates the fleet as a DataFrame (reference implementation).
+        'array' evaluates the fleet on a FleetState of NumPy columns, which is
+        much faster on large solutions and returns the same objective.
+        'incremental' keeps the capacity, lifespan and cost terms as running
+        counters of an IncrementalFleetState, so a time-step only touches the
+        servers of its actions and expiries. It returns the same objective up
+        to floating point rounding.
+    failure_sampling : str
+        How the failure rates are drawn, see FailureRateSampler.
+        'reproducible' gives every cell the same f as the original per-cell
+        draws; 'tensor' pre-generates one f per (time-step, generation,
+        latency sensitivity).
+    rng : numpy.random.RandomState or numpy.random.Generator
+        Random generator used for the demand and the failure rates. When it
+        is None the global NumPy random state is seeded with seed, otherwise
+        seed is ignored and the global random state is not touched, so that
+        several evaluations can run side by side.
+        np.random.RandomState(seed) gives the same objective as seed.
+    trace : str
+        Path of a trace file. When it is given, the time of every stage of
+        the evaluation and the fleet size of every time-step are recorded
+        there, see tracing.py.
+    trace_format : str
+        'jsonl' (JSON lines) or 'chrome' (Chrome trace format).
+    report : dict
+        When a constraint violation makes the function return None, its
+        structured report (see SlotsConstraintViolation) is logged as JSON
+        and, when report is a dict, copied into it.
 
     @Sai Surisetti - c1_max_violations is not passed in as a parameter but mentioned
     in the description that it is a parameter.
@@ -570,7 +1169,9 @@ def evaluation_function(solution,
     ------
     This function returns a float that represents the value of the objective
     function O evaluated across all time-steps.
-    In case the solution cannot be evaluated the function returns None.
+    In case the solution cannot be evaluated the function returns None. This
+    includes a solution without rows, or whose rows are all dropped for unknown
+    actions, datacenters or server generations.
     """
 
     # SET RANDOM SEED
@@ -585,17 +1186,31 @@ def evaluation_function(solution,
     the sequence of random numbers (and consequently the generated random walk ts) will be the same.
 
     '''
-    np.random.seed(seed)
+    # AN UNKNOWN ENGINE IS A MISTAKE OF THE CALLER, NOT OF THE SOLUTION
+    check_engine(engine)
+    if rng is None:
+        np.random.seed(seed)
     # EVALUATE SOLUTION
     try:
-        return get_evaluation(solution, 
-                              demand,
-                              datacenters,
-                              servers,
-                              selling_prices,
-                              time_steps=time_steps, 
-                              verbose=verbose)
+        with get_trace(trace, trace_format) as TRACE:
+            return get_evaluation(solution, 
+                                  demand,
+                                  datacenters,
+                                  servers,
+                                  selling_prices,
+                                  time_steps=time_steps, 
+                                  verbose=verbose,
+                                  engine=engine,
+                                  failure_sampling=failure_sampling,
+                                  rng=rng,
+                                  trace=TRACE)
     # CATCH EXCEPTIONS
     except Exception as e:
-        logger.error(e)
+        violation = getattr(e, 'report', None)
+        if violation is not None:
+            logger.error(f'{e} {json.dumps(violation)}')
+            if report is not None:
+                report.update(violation)
+        else:
+            logger.error(e)
         return None
\ No newline at end of file
@@ -0,0 +1,242 @@
+import numpy as np
+
+class FleetState:
+    """
+    Fleet of servers kept in preallocated NumPy columns.
+
+    Every server that enters the fleet gets the next free row. Rows are never
+    reused, so the alive rows are always in the order in which the servers
+    entered the fleet (the same order as the pandas FLEET DataFrame).
+
+    Columns:
+        generation : index into get_known('server_generation')
+        datacenter : index into get_known('datacenter_id') where the server is now
+        home       : datacenter index the server entered the fleet with. The
+                     pandas evaluator merges cost_of_energy, latency_sensitivity
+                     and slots_capacity on the buy row and does not refresh them
+                     on a move, so those attributes are looked up through home.
+        lifespan   : number of time-steps the server has been aged
+        moved      : True once the server has been moved
+        alive      : True while the server is part of the fleet
+        server_id  : int32 handle of the server (see evaluation.intern_server_ids)
+
+    Slot usage by datacenter, updated on every buy, move and removal:
+        datacenter_servers        : number of servers
+        datacenter_slots          : sum of their slots_size
+        datacenter_slots_capacity : sum of the slots_capacity of their home
+                                    datacenters (the pandas evaluator compares
+                                    the used slots with its mean)
+    """
+
+    def __init__(self, size, life_expectancy, slots_size, slots_capacity, server_ids=None):
+        self.generation = np.zeros(size, dtype=np.int8)
+        self.datacenter = np.zeros(size, dtype=np.int8)
+        self.home = np.zeros(size, dtype=np.int8)
+        self.lifespan = np.zeros(size, dtype=np.int32)
+        self.moved = np.zeros(size, dtype=bool)
+        self.alive = np.zeros(size, dtype=bool)
+        self.server_id = np.zeros(size, dtype=np.int32)
+        # LIFE EXPECTANCY AND SLOTS SIZE BY GENERATION INDEX, SLOTS CAPACITY
+        # BY DATACENTER INDEX
+        self.life_expectancy = np.asarray(life_expectancy)
+        self.slots_size = np.asarray(slots_size, dtype=np.int64)
+        self.slots_capacity = np.asarray(slots_capacity, dtype=np.int64)
+        self.datacenter_servers = np.zeros(len(self.slots_capacity), dtype=np.int64)
+        self.datacenter_slots = np.zeros(len(self.slots_capacity), dtype=np.int64)
+        self.datacenter_slots_capacity = np.zeros(len(self.slots_capacity), dtype=np.int64)
+        # server_id STRINGS BY HANDLE, ONLY USED IN ERROR REPORTS
+        self.server_ids = server_ids
+        # HANDLE -> ROW OF THE SERVER CURRENTLY IN THE FLEET (-1 WHEN IT IS NOT)
+        self.index = np.full(size if server_ids is None else len(server_ids), -1, dtype=np.int64)
+        self.size = 0
+        self.count = 0
+
+    @property
+    def empty(self):
+        return self.count == 0
+
+    def rows(self):
+        # ROWS OF THE SERVERS CURRENTLY IN THE FLEET, IN FLEET ORDER
+        return np.flatnonzero(self.alive[:self.size])
+
+    def lookup(self, server_ids):
+        # MAP SERVER HANDLES TO ROWS. LIKE fleet.loc[...] IT RAISES A KeyError
+        # WHEN A SERVER IS NOT IN THE FLEET.
+        rows = self.index[server_ids]
+        if (rows < 0).any():
+            missing = np.asarray(server_ids)[rows < 0]
+            if self.server_ids is not None:
+                missing = self.server_ids[missing]
+            raise(KeyError(f'{list(missing)} not in index'))
+        return rows
+
+    def add(self, server_ids, generations, datacenters):
+        # BUY: APPEND NEW SERVERS WITH lifespan = 0 AND moved = False
+        n = len(server_ids)
+        rows = np.arange(self.size, self.size + n)
+        self.generation[rows] = generations
+        self.datacenter[rows] = datacenters
+        self.home[rows] = datacenters
+        self.lifespan[rows] = 0
+        self.moved[rows] = False
+        self.alive[rows] = True
+        self.server_id[rows] = server_ids
+        self.index[server_ids] = rows
+        self.size += n
+        self.count += n
+        self.update_slots(rows, 1)
+
+    def move(self, server_ids, datacenters):
+        # MOVE: CHANGE THE DATACENTER AND FLAG THE SERVERS AS MOVED
+        rows = self.lookup(server_ids)
+        self.update_slots(rows, -1)
+        self.datacenter[rows] = datacenters
+        self.update_slots(rows, 1)
+        self.moved[rows] = True
+
+    def dismiss(self, server_ids):
+        # DISMISS: TAKE THE SERVERS OUT OF THE FLEET
+        self.remove(self.lookup(server_ids))
+
+    def remove(self, rows):
+        self.update_slots(rows, -1)
+        self.alive[rows] = False
+        self.count -= len(rows)
+        self.index[self.server_id[rows]] = -1
+
+    def update_slots(self, rows, sign):
+        # ADD (sign=1) OR SUBTRACT (sign=-1) THE SLOT USAGE OF rows IN THEIR
+        # CURRENT DATACENTERS
+        n = len(self.slots_capacity)
+        dc = self.datacenter[rows]
+        self.datacenter_servers += sign * np.bincount(dc, minlength=n)
+        self.datacenter_slots += sign * np.bincount(dc, weights=self.slots_size[self.generation[rows]], minlength=n).astype(np.int64)
+        self.datacenter_slots_capacity += sign * np.bincount(dc, weights=self.slots_capacity[self.home[rows]], minlength=n).astype(np.int64)
+
+    def get_slots(self):
+        # SERVERS, USED SLOTS AND SUM OF THE slots_capacity OF THE HOME
+        # DATACENTERS, BY DATACENTER
+        return self.datacenter_servers, self.datacenter_slots, self.datacenter_slots_capacity
+
+    def age(self):
+        # INCREASE THE LIFESPAN BY ONE AND DROP THE SERVERS THAT REACHED
+        # THEIR LIFE EXPECTANCY
+        rows = self.rows()
+        self.lifespan[rows] += 1
+        expired = rows[self.lifespan[rows] >= self.life_expectancy[self.generation[rows]]]
+        if expired.size:
+            self.remove(expired)
+
+class IncrementalFleetState(FleetState):
+    """
+    FleetState that keeps the aggregates of the objective as running counters,
+    so that a time-step only touches the servers bought, moved, dismissed or
+    expired in it.
+
+    Servers that enter the fleet at the same clock tick form a cohort. All the
+    servers of the fleet are aged together, so the lifespan of a server is
+    clock - entry and aging is a single clock increment. At every tick exactly
+    one cohort per generation reaches its life expectancy.
+
+    Counters:
+        counts        : servers by (generation, home datacenter, datacenter)
+        cohorts       : servers by (generation, entry tick)
+        moved_cohorts : moved servers by (generation, entry tick)
+        lifespans     : sum of the lifespans by generation
+
+    The lifespan column of FleetState is not kept; use get_lifespans(rows).
+    tables are the lookup tables of evaluation.get_fleet_tables.
+    """
+
+    def __init__(self, size, tables, time_steps, server_ids=None):
+        super().__init__(size, tables['life_expectancy'], tables['slots_size'], tables['slots_capacity'], server_ids)
+        self.tables = tables
+        n_g = len(tables['capacity'])
+        n_dc = len(tables['cost_of_energy'])
+        self.entry = np.zeros(size, dtype=np.int32)
+        self.clock = 0
+        # ROWS OF EVERY COHORT. ROWS ARE APPENDED IN ENTRY ORDER SO A COHORT
+        # IS THE CONTIGUOUS RANGE cohort_start[c]:cohort_end[c]
+        self.cohort_start = np.zeros(time_steps + 1, dtype=np.int64)
+        self.cohort_end = np.zeros(time_steps + 1, dtype=np.int64)
+        self.counts = np.zeros((n_g, n_dc, n_dc), dtype=np.int64)
+        self.cohorts = np.zeros((n_g, time_steps + 1), dtype=np.int64)
+        self.moved_cohorts = np.zeros((n_g, time_steps + 1), dtype=np.int64)
+        self.lifespans = np.zeros(n_g, dtype=np.int64)
+        # MAINTENANCE COST OF ONE SERVER BY (generation, lifespan)
+        x = np.arange(time_steps + 2)
+        b = tables['average_maintenance_fee'][:, None]
+        xhat = tables['life_expectancy'][:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.maintenance = b * (1 + (((1.5)*(x))/xhat * np.log2(((1.5)*(x))/xhat)))
+
+    def get_lifespans(self, rows):
+        return self.clock - self.entry[rows]
+
+    def add(self, server_ids, generations, datacenters):
+        if self.cohort_end[self.clock] == 0:
+            self.cohort_start[self.clock] = self.size
+        super().add(server_ids, generations, datacenters)
+        self.cohort_end[self.clock] = self.size
+        rows = np.arange(self.size - len(server_ids), self.size)
+        self.entry[rows] = self.clock
+        g = self.generation[rows]
+        np.add.at(self.counts, (g, self.home[rows], self.datacenter[rows]), 1)
+        self.cohorts[:, self.clock] += np.bincount(g, minlength=self.cohorts.shape[0])
+
+    def move(self, server_ids, datacenters):
+        rows = self.lookup(server_ids)
+        g = self.generation[rows]
+        h = self.home[rows]
+        np.add.at(self.counts, (g, h, self.datacenter[rows]), -1)
+        np.add.at(self.counts, (g, h, datacenters), 1)
+        first = rows[~self.moved[rows]]
+        np.add.at(self.moved_cohorts, (self.generation[first], self.entry[first]), 1)
+        self.update_slots(rows, -1)
+        self.datacenter[rows] = datacenters
+        self.update_slots(rows, 1)
+        self.moved[rows] = True
+
+    def remove(self, rows):
+        g = self.generation[rows]
+        c = self.entry[rows]
+        np.add.at(self.counts, (g, self.home[rows], self.datacenter[rows]), -1)
+        np.add.at(self.cohorts, (g, c), -1)
+        m = self.moved[rows]
+        np.add.at(self.moved_cohorts, (g[m], c[m]), -1)
+        self.lifespans -= np.bincount(g, weights=self.get_lifespans(rows), minlength=len(self.lifespans)).astype(np.int64)
+        super().remove(rows)
+
+    def age(self):
+        # ONE CLOCK TICK: EVERY LIFESPAN GROWS BY ONE, THEN THE COHORTS THAT
+        # REACHED THEIR LIFE EXPECTANCY LEAVE THE FLEET
+        self.clock += 1
+        self.lifespans += self.cohorts.sum(axis=1)
+        for g, c in enumerate(self.clock - self.life_expectancy):
+            if c >= 0 and self.cohorts[g, c]:
+                rows = np.arange(self.cohort_start[c], self.cohort_end[c])
+                rows = rows[self.alive[rows] & (self.generation[rows] == g)]
+                self.remove(rows)
+
+    def get_capacity_counts(self):
+        # NUMBER OF SERVERS BY (generation, latency sensitivity of the home datacenter)
+        by_home = self.counts.sum(axis=2)
+        ls = self.tables['latency_sensitivity']
+        n = np.zeros((by_home.shape[0], ls.max() + 1), dtype=np.int64)
+        np.add.at(n.T, ls, by_home.T)
+        return n
+
+    def get_normalized_lifespan(self):
+        return (self.lifespans / self.life_expectancy).sum() / self.count
+
+    def get_cost(self):
+        # ENERGY + MAINTENANCE + PURCHASE (lifespan == 1) + MOVING (moved, lifespan != 1)
+        t = self.tables
+        energy = t['energy_consumption'] @ self.counts.sum(axis=2) @ t['cost_of_energy']
+        c = np.arange(self.clock)
+        active = self.cohorts[:, :self.clock]
+        maintenance = (active * self.maintenance[:, self.clock - c]).sum()
+        new = self.clock - 1
+        purchase = t['purchase_price'] @ self.cohorts[:, new]
+        moving = t['cost_of_moving'] @ (self.moved_cohorts.sum(axis=1) - self.moved_cohorts[:, new])
+        return energy + maintenance + (purchase + moving)
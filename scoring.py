@@ -1,7 +1,81 @@
 import os
+import time
+import resource
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+from seeds import known_seeds
 from utils import load_problem_data, load_solution
 from evaluation import evaluation_function
 
+def get_memory_usage():
+    # CURRENT AND PEAK RESIDENT MEMORY OF THE PROCESS IN KILOBYTES, FROM VmRSS
+    # AND VmHWM OF /proc/self/status. WITHOUT /proc ONLY ru_maxrss (KILOBYTES
+    # ON LINUX) IS AVAILABLE AND IT IS RETURNED FOR BOTH.
+    try:
+        with open('/proc/self/status') as f:
+            status = dict(line.split(':', 1) for line in f if line.startswith(('VmRSS', 'VmHWM')))
+        return int(status['VmRSS'].split()[0]), int(status['VmHWM'].split()[0])
+    except (OSError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak, peak
+
+def reset_peak_memory():
+    # RESET VmHWM TO THE CURRENT RESIDENT MEMORY (LINUX 4.0+), SO THAT THE
+    # PEAK DOES NOT INCLUDE WHAT THE PROCESS OR ITS PARENT USED BEFORE.
+    # ru_maxrss CANNOT BE RESET AND EVEN KEEPS THE PEAK OF THE PARENT ACROSS
+    # fork AND exec.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def score_seed(seed, outputdirectory, engine='array', rng_type='legacy'):
+    # SCORE THE SOLUTION <seed>.json OF outputdirectory WITH ITS OWN RANDOM
+    # GENERATOR, SO THAT MANY SEEDS CAN BE SCORED AT THE SAME TIME.
+    # rng_type='legacy' USES np.random.RandomState(seed), WHICH GIVES THE SAME
+    # OBJECTIVE AS THE OFFICIAL np.random.seed(seed) EVALUATION.
+    # rng_type='generator' USES np.random.default_rng(seed).
+    start = time.perf_counter()
+    reset_peak_memory()
+    start_memory, _ = get_memory_usage()
+    if rng_type == 'legacy':
+        rng = np.random.RandomState(seed)
+    elif rng_type == 'generator':
+        rng = np.random.default_rng(seed)
+    else:
+        raise(ValueError(f'Unknown random generator type: {rng_type}.'))
+    path = os.path.join(outputdirectory, f'{seed}.json')
+    if os.path.exists(path):
+        solution = load_solution(path)
+        demand, datacenters, servers, selling_prices = load_problem_data()
+        score = evaluation_function(solution, demand, datacenters, servers, selling_prices, rng=rng, engine=engine)
+    else:
+        score = None
+    # peak_memory_mb IS THE PEAK RESIDENT MEMORY WHILE SCORING THIS SEED,
+    # memory_increase_mb HOW MUCH OF IT THE SCORING ADDED TO THE PROCESS
+    _, peak_memory = get_memory_usage()
+    return {'seed': seed,
+            'objective': score,
+            'wall_time': time.perf_counter() - start,
+            'peak_memory_mb': peak_memory / 1024,
+            'memory_increase_mb': (peak_memory - start_memory) / 1024}
+
+def _score_seed(args):
+    return score_seed(*args)
+
+def score_seeds(seeds, outputdirectory, processes=None, engine='array', rng_type='legacy'):
+    # SCORE THE SOLUTIONS OF MANY SEEDS IN A PROCESS POOL. EVERY SEED RUNS IN
+    # A FRESH WORKER (maxtasksperchild=1). A FORKED WORKER STARTS WITH THE
+    # MEMORY OF THE PARENT, SO peak_memory_mb INCLUDES IT AND
+    # memory_increase_mb IS THE MEMORY OF THAT SEED ONLY. RETURNS ONE ROW PER
+    # SEED, IN THE ORDER OF seeds.
+    tasks = [(seed, outputdirectory, engine, rng_type) for seed in seeds]
+    with Pool(processes=processes, maxtasksperchild=1) as pool:
+        results = pool.map(_score_seed, tasks, chunksize=1)
+    return pd.DataFrame(results).set_index('seed')
+
 outputdirectory_if_sample = "output_sample/"
 outputdirectory_if_actual = "output_actual/"
 
@@ -18,25 +92,35 @@ USAGE IMPORTANT!!!
 
 '''
 
-outputdirectory = outputdirectory_if_sample
+# SET TO True TO SCORE <seed>.json FOR EVERY TRAINING SEED IN PARALLEL INSTEAD OF ONLY THE LATEST FILE
+score_all_seeds = False
 
-json_files = [f for f in os.listdir(outputdirectory) if f.endswith('.json')]
+def main():
+    outputdirectory = outputdirectory_if_sample
 
-latest_file = max(json_files, key=lambda f: os.path.getmtime(os.path.join(outputdirectory, f)))
+    if score_all_seeds:
+        results = score_seeds(known_seeds('training'), outputdirectory)
+        print(results)
+        print(f'Mean objective: {results["objective"].mean()}')
+        return
 
-filenumber = int(latest_file.split(".")[0])
+    json_files = [f for f in os.listdir(outputdirectory) if f.endswith('.json')]
 
-solution = load_solution(os.path.join(outputdirectory, f'{filenumber}.json')) # SOLUTION IS PANDAS DATAFRAME CREATED FROM <SEED>.JSON FILE
+    latest_file = max(json_files, key=lambda f: os.path.getmtime(os.path.join(outputdirectory, f)))
 
-demand, datacenters, servers, selling_prices = load_problem_data() # ALL THESE VARIABLE ARE PANDAS DATAFRAMES CREATED FROM .CSV FILES IN ./DATA/ FOLDER
+    filenumber = int(latest_file.split(".")[0])
 
-# Print solution
-#print(solution)
+    solution = load_solution(os.path.join(outputdirectory, f'{filenumber}.json')) # SOLUTION IS PANDAS DATAFRAME CREATED FROM <SEED>.JSON FILE
 
+    demand, datacenters, servers, selling_prices = load_problem_data() # ALL THESE VARIABLE ARE PANDAS DATAFRAMES CREATED FROM .CSV FILES IN ./DATA/ FOLDER
 
-score = evaluation_function(solution, demand, datacenters, servers, selling_prices, seed=filenumber, debugging=True) # SCORE IS ANSWER, ENTRY POINT STAGE 1
+    # Print solution
+    #print(solution)
 
-'''
+
+    score = evaluation_function(solution, demand, datacenters, servers, selling_prices, seed=filenumber, debugging=True) # SCORE IS ANSWER, ENTRY POINT STAGE 1
+
+    '''
 
 def evaluation_function(solution, 
                         demand,
@@ -56,4 +140,7 @@ Recap: our solution "123.json", ./data/demand.csv, ./data/datacenters.csv, ./dat
 Entry Point 1, We are getting "score" as the answer, THIS IS THE FINAL OBJECTIVE, TO MAXIMIZE THIS SCORE.
 '''
 
-print(f'Solution score: {score}')
+    print(f'Solution score: {score}')
+
+if __name__ == '__main__':
+    main()
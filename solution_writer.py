@@ -0,0 +1,177 @@
+import json
+import numpy as np
+import pandas as pd
+from evaluation import get_known
+
+'''
+
+Solution writers used by the Simulation to stream its actions to disk one
+time-step at a time instead of keeping the whole action log in memory.
+
+    'json'     : a JSON array of solution rows, written in chunks. It is the
+                 submission format and loads with utils.load_solution.
+    'jsonl'    : one compact JSON solution row per line (JSON Lines). It loads
+                 with utils.load_solution when the file ends with .jsonl.
+    'columnar' : compact binary columns, one block of .npy arrays per
+                 time-step, one after the other in a single .cols file. It is
+                 not a .npy file: np.load would only read its first array.
+                 utils.load_solution_columns (and utils.load_solution) read it
+                 like the JSON formats, load_columnar_solution gives the
+                 DataFrame and convert_columnar_to_json the submission JSON.
+
+write() accepts solution rows (dicts), single-row lists of dicts and
+TransactionBatch objects (anything with a records() method).
+
+'''
+
+def get_records(transactions):
+    # HELPER FUNCTION TO FLATTEN THE TRANSACTIONS TO SOLUTION ROWS
+    records = []
+    for transaction in transactions:
+        if hasattr(transaction, 'records'):
+            records.extend(transaction.records())
+        elif isinstance(transaction, list):
+            records.extend(transaction)
+        else:
+            records.append(transaction)
+    return records
+
+class SolutionWriter:
+    """ Base class of the solution writers: write() one time-step at a time, then close(). """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self.rows = 0
+
+    def write(self, transactions):
+        raise NotImplementedError
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class JsonArraySolutionWriter(SolutionWriter):
+    """ Streams the solution rows as a JSON array, flushed after every write. """
+    def __init__(self, path):
+        super().__init__(path)
+        self.file.write('[')
+
+    def write(self, transactions):
+        records = get_records(transactions)
+        if records:
+            separator = ',\n' if self.rows else '\n'
+            self.file.write(separator + ',\n'.join(json.dumps(record, ensure_ascii=False) for record in records))
+            self.rows += len(records)
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write('\n]\n' if self.rows else ']\n')
+            self.file.close()
+
+class JsonLinesSolutionWriter(SolutionWriter):
+    """ Streams the solution rows as JSON Lines, flushed after every write. """
+    def write(self, transactions):
+        records = get_records(transactions)
+        for record in records:
+            self.file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.rows += len(records)
+        self.file.flush()
+
+class ColumnarSolutionWriter(SolutionWriter):
+    """
+    Streams the solution as binary columns. Every write appends one block of
+    five .npy arrays: time_step, datacenter, server_generation and action as
+    small integer codes (indices into get_known) and server_id as bytes.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.rows = 0
+
+    def write(self, transactions):
+        records = get_records(transactions)
+        if records:
+            for array in get_solution_columns(records):
+                np.save(self.file, array, allow_pickle=False)
+            self.rows += len(records)
+        self.file.flush()
+
+def get_solution_columns(records):
+    # HELPER FUNCTION TO ENCODE SOLUTION ROWS AS THE COLUMNAR ARRAYS
+    codes = [{v: i for i, v in enumerate(get_known(key))} for key in ['datacenter_id', 'server_generation', 'actions']]
+    return [np.array([r['time_step'] for r in records], dtype=np.int16),
+            np.array([codes[0][r['datacenter_id']] for r in records], dtype=np.int8),
+            np.array([codes[1][r['server_generation']] for r in records], dtype=np.int8),
+            np.array([codes[2][r['action']] for r in records], dtype=np.int8),
+            np.array([r['server_id'] for r in records]).astype(np.bytes_)]
+
+def read_columnar_blocks(path):
+    # HELPER FUNCTION TO READ THE BLOCKS OF A COLUMNAR SOLUTION ONE AFTER THE OTHER
+    with open(path, 'rb') as f:
+        while f.peek(1):
+            yield [np.load(f, allow_pickle=False) for _ in range(5)]
+
+def load_columnar_solution_columns(path, known=None):
+    # SAME COLUMNS AS utils.load_solution_columns FOR A COLUMNAR SOLUTION
+    blocks = list(read_columnar_blocks(path))
+    if not blocks:
+        raise(KeyError('The solution has no rows.'))
+    time_step, datacenter, generation, action, server_id = [np.concatenate(c) for c in zip(*blocks)]
+    values = {'datacenter_id': np.array(get_known('datacenter_id'), dtype=object)[datacenter],
+              'server_generation': np.array(get_known('server_generation'), dtype=object)[generation],
+              'server_id': server_id.astype(str).astype(object),
+              'action': np.array(get_known('actions'), dtype=object)[action]}
+    columns = {'time_step': time_step.astype(np.int32), 'labels': {}, 'order': get_known('required_columns')}
+    for c, v in values.items():
+        # THE VALUES OF known COME FIRST, THEN THE OTHERS IN ORDER OF APPEARANCE
+        first = np.array((known or {}).get(c, []), dtype=object)
+        codes, labels = pd.factorize(np.concatenate([first, v]), use_na_sentinel=False)
+        columns[c] = codes[len(first):].astype(np.int32 if c == 'server_id' else np.int16)
+        columns['labels'][c] = list(labels)
+    return columns
+
+def load_columnar_solution(path):
+    # LOAD A COLUMNAR SOLUTION TO A PANDAS DataFrame WITH THE SOLUTION COLUMNS
+    blocks = list(read_columnar_blocks(path))
+    if not blocks:
+        return pd.DataFrame(columns=get_known('required_columns'))
+    time_step, datacenter, generation, action, server_id = [np.concatenate(c) for c in zip(*blocks)]
+    return pd.DataFrame({'time_step': time_step.astype(np.int64),
+                         'datacenter_id': np.array(get_known('datacenter_id'))[datacenter],
+                         'server_generation': np.array(get_known('server_generation'))[generation],
+                         'server_id': server_id.astype(str),
+                         'action': np.array(get_known('actions'))[action]})
+
+def convert_columnar_to_json(path, json_path):
+    # CONVERT A COLUMNAR SOLUTION TO THE SUBMISSION JSON, ONE BLOCK AT A TIME
+    datacenters = get_known('datacenter_id')
+    generations = get_known('server_generation')
+    actions = get_known('actions')
+    with JsonArraySolutionWriter(json_path) as writer:
+        for time_step, datacenter, generation, action, server_id in read_columnar_blocks(path):
+            writer.write([{'time_step': int(ts),
+                           'datacenter_id': datacenters[dc],
+                           'server_generation': generations[sg],
+                           'server_id': sid.decode(),
+                           'action': actions[a]} for ts, dc, sg, a, sid in zip(time_step, datacenter, generation, action, server_id)])
+    return json_path
+
+def get_solution_writer(path, output_format='json'):
+    # CREATE THE SOLUTION WRITER OF A GIVEN FORMAT
+    writers = {'json': JsonArraySolutionWriter,
+               'jsonl': JsonLinesSolutionWriter,
+               'columnar': ColumnarSolutionWriter}
+    if output_format not in writers:
+        raise(ValueError(f'Unknown solution format: {output_format}.'))
+    return writers[output_format](path)
+
+def get_solution_extension(output_format='json'):
+    # FILE EXTENSION OF EACH SOLUTION FORMAT
+    return {'json': 'json', 'jsonl': 'jsonl', 'columnar': 'cols'}[output_format]
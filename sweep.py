@@ -0,0 +1,183 @@
+import os
+import sys
+import time
+import argparse
+import itertools
+import tempfile
+import numpy as np
+import pandas as pd
+from contextlib import redirect_stdout
+from seeds import known_seeds
+from utils import load_problem_data, load_solution_columns, get_shared, get_shared_pool
+from evaluation import evaluation_function, get_known
+from Classes import ProblemData, InputDemandDataActual
+from application import Simulation, DATACENTER_PREFERENCES, group_lookaheads
+
+'''
+
+Parameter sweep of the Simulation policy.
+
+    python sweep.py --lookaheads 10 30 60 --rules default spread --seeds 3329 4201
+
+Every configuration of the grid (every combination of magic_number_future and
+datacenter rules) is simulated for every seed and scored in-process with
+evaluation_function, with the same random generator as score_seed. The
+problem data is loaded once in the parent process (through the problem data
+cache) and shared with the workers of the pool with the 'fork' start method;
+every worker keeps the actual demand of the seeds it has seen.
+
+The seeds are run one round at a time. After min_seeds rounds, the
+configurations whose mean objective is more than abort_margin (relative) below
+the best mean are aborted and not run on the remaining seeds. A configuration
+whose solution cannot be evaluated is aborted at once.
+
+Lookaheads that make buy plan the same purchases (see group_lookaheads) give
+the same solution, so only one of them is simulated per seed and the others
+reuse its objective.
+
+The result is a table with one row per configuration, ranked by mean objective.
+
+'''
+
+# Datacenters to buy in by latency sensitivity, by name of the rule
+DATACENTER_RULES = {'default': DATACENTER_PREFERENCES,
+                    'spread': {'high': ['DC3', 'DC4'], 'medium': ['DC2', 'DC3', 'DC4'], 'low': ['DC1', 'DC2']},
+                    'high_first_dc4': {'high': ['DC4', 'DC3'], 'medium': ['DC2'], 'low': ['DC1']}}
+
+SWEEP_GRID = {'magic_number_future': [10, 30, 60],
+              'datacenter_rules': list(DATACENTER_RULES)}
+
+# Actual demand by seed of every worker
+_demands = {}
+
+def get_configurations(grid=SWEEP_GRID):
+    # EVERY COMBINATION OF THE VALUES OF THE GRID, AS A LIST OF DICTS
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*[grid[k] for k in keys])]
+
+def get_seed_demand(seed):
+    # HELPER FUNCTION TO BUILD THE ACTUAL DEMAND OF A SEED ONCE PER PROCESS
+    if seed not in _demands:
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            _demands[seed] = InputDemandDataActual(seed = seed)
+    return _demands[seed]
+
+def run_configuration(configuration, seed, outputdirectory, time_steps=get_known('time_steps'), engine='array'):
+    # SIMULATE ONE CONFIGURATION FOR ONE SEED AND SCORE ITS SOLUTION
+    start = time.perf_counter()
+    givens = get_shared('givens') or ProblemData()
+    demand, datacenters, servers, selling_prices = get_shared('problem_data') or load_problem_data()
+    actual_demand = get_seed_demand(seed)
+    output_path = os.path.join(outputdirectory, f'{seed}-{os.getpid()}-{time.perf_counter_ns()}.json')
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        simulation = Simulation(givens, actual_demand, seed, time_steps, False, output_path,
+                                magic_number_future=configuration['magic_number_future'],
+                                datacenter_preferences=DATACENTER_RULES[configuration['datacenter_rules']])
+        simulation.start_simulation()
+    try:
+        solution = load_solution_columns(output_path)
+    except KeyError:
+        solution = None
+    finally:
+        os.remove(output_path)
+    objective = None
+    if solution is not None:
+        objective = evaluation_function(solution, demand, datacenters, servers, selling_prices,
+                                        time_steps=time_steps, rng=np.random.RandomState(seed), engine=engine)
+    return {'objective': objective, 'wall_time': time.perf_counter() - start}
+
+def _run_configuration(args):
+    return run_configuration(*args)
+
+def get_distinct_configurations(configurations, seed, givens, time_steps):
+    # CONFIGURATIONS TO SIMULATE FOR A SEED: ONE PER GROUP OF CONFIGURATIONS
+    # THAT ONLY DIFFER BY LOOKAHEADS OF THE SAME group_lookaheads GROUP.
+    # RETURNS THE REPRESENTATIVE OF EVERY CONFIGURATION.
+    lookaheads = sorted({c['magic_number_future'] for c in configurations})
+    groups = group_lookaheads(givens, get_seed_demand(seed), lookaheads, time_steps)
+    group = {lookahead: min(g) for g in groups for lookahead in g}
+    representatives = {}
+    for i, c in enumerate(configurations):
+        key = tuple(sorted({**c, 'magic_number_future': group[c['magic_number_future']]}.items()))
+        representatives.setdefault(key, i)
+        yield representatives[key]
+
+def run_sweep(grid=SWEEP_GRID,
+              seeds=known_seeds('training'),
+              processes=None,
+              time_steps=get_known('time_steps'),
+              engine='array',
+              min_seeds=2,
+              abort_margin=0.1,
+              verbose=True):
+    # RUN THE SWEEP AND RETURN THE RANKED RESULTS TABLE
+    configurations = get_configurations(grid)
+    givens = ProblemData()
+    problem_data = load_problem_data()
+    objectives = np.full((len(configurations), len(seeds)), np.nan)
+    wall_times = np.zeros(len(configurations))
+    aborted = np.zeros(len(configurations), dtype=bool)
+    with tempfile.TemporaryDirectory() as outputdirectory, \
+         get_shared_pool(processes, givens=givens, problem_data=problem_data) as pool:
+        for r, seed in enumerate(seeds):
+            active = np.flatnonzero(~aborted)
+            representatives = list(get_distinct_configurations(configurations, seed, givens, time_steps))
+            runs = sorted({representatives[i] for i in active})
+            tasks = [(configurations[i], seed, outputdirectory, time_steps, engine) for i in runs]
+            results = dict(zip(runs, pool.map(_run_configuration, tasks, chunksize=1)))
+            charged = set()
+            for i in active:
+                result = results[representatives[i]]
+                objectives[i, r] = np.nan if result['objective'] is None else result['objective']
+                # THE TIME OF A SIMULATION IS CHARGED TO THE FIRST CONFIGURATION THAT USES IT
+                if representatives[i] not in charged:
+                    charged.add(representatives[i])
+                    wall_times[i] += result['wall_time']
+            # ABORT THE INVALID CONFIGURATIONS AND, AFTER min_seeds ROUNDS, THE CLEARLY LOSING ONES
+            aborted[active[np.isnan(objectives[active, r])]] = True
+            if r + 1 >= min_seeds and (~aborted).any():
+                mean = objectives[:, :r + 1].mean(axis=1)
+                best = mean[~aborted].max()
+                aborted |= ~aborted & (mean < best - abort_margin * abs(best))
+            if verbose:
+                print(f'Seed {seed}: {len(runs)} simulations, {int((~aborted).sum())} configurations left', file=sys.stderr)
+    return get_sweep_table(configurations, seeds, objectives, wall_times, aborted)
+
+def get_sweep_table(configurations, seeds, objectives, wall_times, aborted):
+    # HELPER FUNCTION TO BUILD THE RESULTS TABLE, RANKED BY MEAN OBJECTIVE.
+    # THE MEAN IS OVER THE SEEDS THE CONFIGURATION WAS RUN ON.
+    table = pd.DataFrame(configurations)
+    scores = pd.DataFrame(objectives)
+    table['seeds'] = scores.count(axis=1)
+    table['mean_objective'] = scores.mean(axis=1)
+    table['std_objective'] = scores.std(axis=1, ddof=0)
+    table['min_objective'] = scores.min(axis=1)
+    table['aborted'] = aborted
+    table['wall_time'] = wall_times
+    for j, seed in enumerate(seeds):
+        table[seed] = objectives[:, j]
+    table = table.sort_values(['aborted', 'mean_objective'], ascending=[True, False], na_position='last', ignore_index=True)
+    table.index = pd.RangeIndex(1, len(table) + 1, name='rank')
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description='Parameter sweep of the Simulation policy.')
+    parser.add_argument('--lookaheads', type=int, nargs='*', default=SWEEP_GRID['magic_number_future'], help='values of magic_number_future')
+    parser.add_argument('--rules', nargs='*', default=SWEEP_GRID['datacenter_rules'], choices=list(DATACENTER_RULES), help='datacenter rules')
+    parser.add_argument('--seeds', type=int, nargs='*', default=known_seeds('training'))
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--time-steps', type=int, default=get_known('time_steps'))
+    parser.add_argument('--engine', default='array')
+    parser.add_argument('--min-seeds', type=int, default=2, help='seeds to run before aborting losing configurations')
+    parser.add_argument('--abort-margin', type=float, default=0.1, help='relative distance to the best mean objective to abort a configuration')
+    parser.add_argument('--save', help='save the results table to this CSV file')
+    args = parser.parse_args()
+
+    grid = {'magic_number_future': args.lookaheads, 'datacenter_rules': args.rules}
+    table = run_sweep(grid, args.seeds, args.processes, args.time_steps, args.engine, args.min_seeds, args.abort_margin)
+    print(table.to_string())
+    if args.save:
+        table.to_csv(args.save)
+
+if __name__ == '__main__':
+    main()
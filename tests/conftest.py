@@ -0,0 +1,5 @@
+import os
+import sys
+
+# THE MODULES LIVE AT THE ROOT OF THE REPOSITORY
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
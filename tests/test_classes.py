@@ -0,0 +1,19 @@
+import copy
+import pickle
+import pytest
+from Classes import ProblemData
+
+def test_problem_data_pickle_round_trip():
+    givens = ProblemData()
+    restored = pickle.loads(pickle.dumps(givens))
+    for generation, spec in givens.server_catalog.specs.items():
+        other = restored.server_catalog[generation]
+        assert [getattr(other, name) for name in spec.__slots__] == [getattr(spec, name) for name in spec.__slots__]
+    # THE RESTORED SPECS ARE STILL READ-ONLY
+    with pytest.raises(AttributeError):
+        other.capacity = 0
+
+def test_problem_data_deepcopy():
+    givens = ProblemData()
+    spec = copy.deepcopy(givens).server_catalog['CPU.S1']
+    assert spec.generation == 'CPU.S1' and spec.selling_prices == givens.server_catalog['CPU.S1'].selling_prices
@@ -0,0 +1,36 @@
+import json
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+from utils import load_problem_data
+from evaluation import evaluation_function
+
+@pytest.fixture(scope='module')
+def problem_data():
+    return load_problem_data()
+
+@pytest.mark.parametrize('engine', ['pandas', 'array', 'incremental'])
+def test_slots_overflow_report(problem_data, engine, caplog):
+    # 12623 CPU.S1 SERVERS USE 25246 SLOTS OF THE 25245 OF DC1
+    n = 12623
+    solution = pd.DataFrame({'time_step': 1,
+                             'datacenter_id': 'DC1',
+                             'server_generation': 'CPU.S1',
+                             'server_id': [f'server-{i}' for i in range(n)],
+                             'action': 'buy'})
+    report = {}
+    with caplog.at_level(logging.ERROR):
+        score = evaluation_function(solution, *problem_data, rng=np.random.RandomState(0), engine=engine, report=report)
+    assert score is None
+    assert report == {'constraint': 2,
+                      'time_step': 1,
+                      'datacenters': [{'datacenter_id': 'DC1', 'servers': n, 'used_slots': 2 * n, 'slots_capacity': 25245.0}]}
+    logged = caplog.records[-1].getMessage()
+    assert json.loads(logged[logged.index('{'):]) == report
+
+@pytest.mark.parametrize('engine', ['pandas', 'array', 'incremental'])
+@pytest.mark.parametrize('rows', [[], [[1, 'DC1', 'CPU.S1', 'server-0', 'rent']]])
+def test_solution_without_valid_rows_scores_none(problem_data, engine, rows):
+    solution = pd.DataFrame(rows, columns=['time_step', 'datacenter_id', 'server_generation', 'server_id', 'action'])
+    assert evaluation_function(solution, *problem_data, rng=np.random.RandomState(0), engine=engine) is None
@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import pandas as pd
+from contextlib import nullcontext
+
+'''
+
+Timing instrumentation of the evaluator.
+
+evaluation_function(..., trace=<path>) records a span around every stage of
+the evaluation (solution_data_preparation, get_actual_demand, failure_rates,
+time_step_index and, every time-step, time_step_demand, time_step_fleet,
+update_fleet, capacity, constraint and objective) and one 'step' record per
+time-step with the fleet size. Every span has its wall time and the change of
+the number of memory blocks allocated by Python (sys.getallocatedblocks) while
+it ran.
+
+    'jsonl'  : one JSON record per line. load_trace reads it back and
+               summarize_trace gives the time per stage, to diff two versions.
+    'chrome' : Chrome trace format, for chrome://tracing or ui.perfetto.dev.
+
+When trace is None the evaluator uses NULL_TRACE, whose spans are a shared
+no-op context manager, so the instrumentation costs nothing measurable.
+
+'''
+
+class NullTrace:
+    """ Trace that records nothing. """
+    enabled = False
+
+    def __init__(self):
+        self.context = nullcontext()
+
+    def span(self, name, ts=None):
+        return self.context
+
+    def step(self, ts, fleet_size):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+NULL_TRACE = NullTrace()
+
+class Span:
+    """ Times one stage of the evaluation and hands the record to its trace. """
+    __slots__ = ('trace', 'name', 'ts', 'start', 'blocks')
+
+    def __init__(self, trace, name, ts):
+        self.trace = trace
+        self.name = name
+        self.ts = ts
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        end = time.perf_counter_ns()
+        self.trace.add({'name': self.name,
+                        'ts': self.ts,
+                        'start_us': (self.start - self.trace.origin) / 1000,
+                        'duration_us': (end - self.start) / 1000,
+                        'allocated_blocks': sys.getallocatedblocks() - self.blocks})
+
+class Trace(NullTrace):
+    """ Trace written to path as JSON lines or in the Chrome trace format. """
+    enabled = True
+
+    def __init__(self, path, trace_format='jsonl'):
+        if trace_format not in ['jsonl', 'chrome']:
+            raise(ValueError(f'Unknown trace format: {trace_format}.'))
+        self.path = path
+        self.trace_format = trace_format
+        self.records = []
+        self.origin = time.perf_counter_ns()
+        self.last_step = self.origin
+
+    def span(self, name, ts=None):
+        return Span(self, name, ts)
+
+    def add(self, record):
+        self.records.append(record)
+
+    def step(self, ts, fleet_size):
+        # ONE RECORD PER TIME-STEP WITH THE FLEET SIZE AND THE WALL TIME SINCE
+        # THE PREVIOUS STEP
+        now = time.perf_counter_ns()
+        self.add({'name': 'step',
+                  'ts': ts,
+                  'start_us': (self.last_step - self.origin) / 1000,
+                  'duration_us': (now - self.last_step) / 1000,
+                  'fleet_size': int(fleet_size)})
+        self.last_step = now
+
+    def close(self):
+        if self.records is None:
+            return
+        with open(self.path, 'w', encoding='utf-8') as f:
+            if self.trace_format == 'jsonl':
+                for record in self.records:
+                    f.write(json.dumps(record) + '\n')
+            else:
+                json.dump({'traceEvents': get_chrome_events(self.records)}, f)
+        self.records = None
+
+def get_chrome_events(records):
+    # HELPER FUNCTION TO CONVERT THE RECORDS TO CHROME TRACE EVENTS: THE SPANS
+    # ARE COMPLETE EVENTS AND THE FLEET SIZE IS A COUNTER
+    pid = os.getpid()
+    events = []
+    for record in records:
+        if record['name'] == 'step':
+            events.append({'name': 'fleet_size', 'ph': 'C', 'ts': record['start_us'] + record['duration_us'],
+                           'pid': pid, 'tid': 0, 'args': {'fleet_size': record['fleet_size']}})
+        else:
+            events.append({'name': record['name'], 'ph': 'X', 'ts': record['start_us'], 'dur': record['duration_us'],
+                           'pid': pid, 'tid': 0, 'args': {'ts': record['ts'], 'allocated_blocks': record['allocated_blocks']}})
+    return events
+
+def get_trace(trace=None, trace_format='jsonl'):
+    # TRACE OF AN EVALUATION: NULL_TRACE WHEN trace IS None, A Trace WRITTEN
+    # TO trace WHEN IT IS A PATH, OR trace ITSELF
+    if trace is None:
+        return NULL_TRACE
+    if isinstance(trace, NullTrace):
+        return trace
+    return Trace(trace, trace_format)
+
+def load_trace(path):
+    # LOAD A JSON LINES TRACE TO A PANDAS DataFrame
+    return pd.read_json(path, lines=True)
+
+def summarize_trace(path):
+    # TOTAL AND MEAN TIME, CALLS AND ALLOCATED BLOCKS BY STAGE OF A JSON LINES TRACE
+    trace = load_trace(path)
+    trace = trace[trace['name'] != 'step']
+    return trace.groupby('name').agg(calls=('duration_us', 'size'),
+                                     total_us=('duration_us', 'sum'),
+                                     mean_us=('duration_us', 'mean'),
+                                     allocated_blocks=('allocated_blocks', 'sum')).sort_values('total_us', ascending=False)
@@ -1,6 +1,15 @@
+import os
+import re
 import json
+import shutil
+import hashlib
+import tempfile
+import weakref
+from operator import itemgetter
+from multiprocessing import get_all_start_methods, get_context
+import numpy as np
 import pandas as pd
-from os.path import abspath, join
+from os.path import abspath, dirname, exists, join
 
 def load_json(path):
     return json.load(open(path, encoding='utf-8'))
@@ -9,9 +18,124 @@ def save_json(path, data):
     with open(path, 'w', encoding='utf-8') as out:
         json.dump(data, out, ensure_ascii=False, indent=4)
 
+# COLUMNS OF A SOLUTION ROW
+SOLUTION_COLUMNS = ['time_step', 'datacenter_id', 'server_generation', 'server_id', 'action']
+
 def load_solution(path):
-    # Loads a solution from a json file to a pandas DataFrame.
-    return pd.read_json(path)
+    # Loads a solution from a json file (or a json lines file ending with
+    # .jsonl) to a pandas DataFrame. The file is streamed through
+    # load_solution_columns; files whose rows are not plain solution rows
+    # are loaded with pd.read_json.
+    try:
+        return get_solution_frame(load_solution_columns(path))
+    except (KeyError, TypeError, ValueError, OverflowError):
+        if str(path).endswith('.jsonl'):
+            return pd.read_json(path, lines=True)
+        return pd.read_json(path)
+
+def iter_json_record_chunks(path, chunk_size=1 << 22):
+    # STREAM THE OBJECTS OF A JSON ARRAY (OR OF A JSON LINES FILE) WITHOUT
+    # LOADING THE WHOLE FILE. THE FILE IS READ chunk_size CHARACTERS AT A TIME
+    # AND THE COMPLETE RECORDS OF EVERY CHUNK ARE PARSED WITH ONE json.loads
+    # CALL AND YIELDED AS A LIST.
+    decoder = json.JSONDecoder()
+    separators = re.compile(r'[\s,]*')
+    with open(path, encoding='utf-8-sig') as f:
+        buffer = f.read(chunk_size)
+        position = separators.match(buffer).end()
+        if buffer[position:position + 1] == '[':
+            position += 1
+        while True:
+            position = separators.match(buffer, position).end()
+            chunk = f.read(chunk_size)
+            if not chunk and buffer[position:].rstrip() in ['', ']']:
+                return
+            # RECORDS ARE FLAT OBJECTS, SO THE CHUNK IS CUT AFTER ITS LAST '}'
+            end = max(buffer.rfind('}', position) + 1, position)
+            try:
+                records = json.loads('[' + re.sub(r'\}\s*\n\s*\{', '},{', buffer[position:end]) + ']') if end > position else []
+            except json.JSONDecodeError:
+                # A '}' INSIDE A STRING: DECODE THE RECORDS ONE BY ONE
+                records = []
+                while True:
+                    position = separators.match(buffer, position).end()
+                    if position == len(buffer) or buffer[position] == ']':
+                        break
+                    try:
+                        record, position = decoder.raw_decode(buffer, position)
+                    except json.JSONDecodeError:
+                        if not chunk:
+                            raise
+                        break
+                    records.append(record)
+                end = position
+            if not chunk and not records:
+                raise(json.JSONDecodeError('Unexpected data', buffer, position))
+            if records:
+                yield records
+            buffer, position = buffer[end:] + chunk, 0
+
+def load_solution_columns(path, known=None):
+    # STREAM A SOLUTION INTO COMPACT COLUMNS:
+    #     time_step                                : int32
+    #     datacenter_id, server_generation, action : int16 codes into labels[column]
+    #     server_id                                : int32 codes into labels['server_id']
+    # known MAPS A COLUMN TO THE LABELS THAT GET THE FIRST CODES (FOR EXAMPLE
+    # get_known('actions')), OTHER VALUES GET THE NEXT CODES IN ORDER OF
+    # APPEARANCE. SERVER IDS ARE INTERNED, SO EVERY ID STRING IS KEPT ONCE.
+    # RAISES A KeyError IF A ROW DOES NOT HAVE EXACTLY THE SOLUTION COLUMNS
+    # AND A TypeError IF A time_step IS NOT AN INTEGER. A .cols FILE IS READ
+    # AS A COLUMNAR SOLUTION (SEE solution_writer.py).
+    if str(path).endswith('.cols'):
+        # IMPORTED HERE: solution_writer IMPORTS evaluation, WHICH IMPORTS utils
+        from solution_writer import load_columnar_solution_columns
+        return load_columnar_solution_columns(path, known)
+    coded = [c for c in SOLUTION_COLUMNS if c != 'time_step']
+    time_steps = []
+    chunks = {c: [] for c in coded}
+    uniques = {c: [np.array((known or {}).get(c, []), dtype=object)] for c in coded}
+    order = None
+    for records in iter_json_record_chunks(path):
+        if set(map(len, records)) != {len(SOLUTION_COLUMNS)}:
+            raise(KeyError('Unexpected solution columns.'))
+        if order is None:
+            order = [c for c in records[0] if c in SOLUTION_COLUMNS]
+        values = {c: list(map(itemgetter(c), records)) for c in SOLUTION_COLUMNS}
+        time_step = np.array(values['time_step'])
+        if time_step.dtype.kind != 'i':
+            raise(TypeError('time_step is not an integer.'))
+        if time_step.min() < np.iinfo(np.int32).min or time_step.max() > np.iinfo(np.int32).max:
+            raise(OverflowError('time_step is out of range.'))
+        time_steps.append(time_step.astype(np.int32))
+        for c in coded:
+            # CODES INTO THE UNIQUE VALUES OF THE CHUNK, MAPPED TO THE FINAL
+            # CODES ONCE ALL THE CHUNKS ARE READ
+            chunk_codes, chunk_uniques = pd.factorize(np.array(values[c], dtype=object), use_na_sentinel=False)
+            chunks[c].append(chunk_codes.astype(np.int32))
+            uniques[c].append(chunk_uniques)
+    if order is None:
+        raise(KeyError('The solution has no rows.'))
+    columns = {'time_step': np.concatenate(time_steps), 'labels': {}, 'order': order}
+    for c in coded:
+        # THE VALUES OF known COME FIRST, THEN THE OTHERS IN ORDER OF APPEARANCE
+        mapping, labels = pd.factorize(np.concatenate(uniques[c]), use_na_sentinel=False)
+        offsets = np.cumsum([len(u) for u in uniques[c]])
+        dtype = np.int32 if c == 'server_id' else np.int16
+        columns[c] = np.concatenate([mapping[offset + codes] for offset, codes in zip(offsets, chunks[c])]).astype(dtype)
+        columns['labels'][c] = list(labels)
+    return columns
+
+def get_solution_frame(columns, intern_server_ids=False):
+    # SOLUTION DataFrame OF THE COLUMNS OF load_solution_columns. WITH
+    # intern_server_ids THE server_id COLUMN KEEPS THE int32 CODES, WHOSE
+    # STRINGS ARE columns['labels']['server_id'].
+    frame = {'time_step': columns['time_step'].astype(np.int64)}
+    for c, labels in columns['labels'].items():
+        if c == 'server_id' and intern_server_ids:
+            frame[c] = columns[c].astype(np.int32)
+        else:
+            frame[c] = np.array(labels, dtype=object)[columns[c]]
+    return pd.DataFrame(frame, columns=columns['order'])
 
 def save_solution(solution, path):
     # Saves a solution into a json file.
@@ -19,53 +143,187 @@ def save_solution(solution, path):
         solution = solution.to_dict('records')
     return save_json(path, solution)
 
-def load_problem_data(path=None):
+def parse_release_times(servers):
+    # PARSE THE "[start,end]" RELEASE WINDOWS OF THE SERVERS ONCE INTO THE
+    # INTEGER COLUMNS release_start AND release_end
+    if 'release_start' not in servers.columns:
+        rt = servers['release_time'].str.strip('[]').str.split(',', expand=True).astype(int)
+        servers = servers.assign(release_start=rt.min(axis=1), release_end=rt.max(axis=1))
+    return servers
+
+# NAME OF EVERY PROBLEM TABLE AND ITS CSV FILE IN THE DATA FOLDER
+PROBLEM_DATA_FILES = {'demand': 'demand.csv',
+                      'datacenters': 'datacenters.csv',
+                      'servers': 'servers.csv',
+                      'selling_prices': 'selling_prices.csv'}
+
+# VERSION OF THE LAYOUT OF THE CACHE, PART OF THE CACHE KEY
+PROBLEM_DATA_CACHE_VERSION = 2
+
+def read_problem_table(path, name):
+    # PARSE ONE PROBLEM TABLE FROM ITS CSV FILE
+    table = pd.read_csv(abspath(join(path, PROBLEM_DATA_FILES[name])))
+    if name == 'servers':
+        table = parse_release_times(table)
+    return table
+
+def get_problem_data_hash(path):
+    # CACHE KEY OF THE PROBLEM CSV FILES, FROM THEIR SIZE AND MODIFICATION
+    # TIME, SO THAT A WARM LOAD DOES NOT READ THE CSV FILES
+    h = hashlib.sha1(f'v{PROBLEM_DATA_CACHE_VERSION};'.encode())
+    for name, file in PROBLEM_DATA_FILES.items():
+        stat = os.stat(abspath(join(path, file)))
+        h.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return h.hexdigest()[:16]
+
+def get_problem_data_cache_path(path):
+    return abspath(join(path, '.cache', get_problem_data_hash(path)))
+
+def get_problem_pivots(tables):
+    # PRE-PIVOTED ARRAYS OF THE PROBLEM TABLES, IN THE ORDER OF get_known:
+    #     demand_time_steps, demand_cube: THE OUTPUT OF evaluation.get_demand_base,
+    #         THE CUBE HAS SHAPE (latency sensitivities, server generations, time-steps)
+    #     selling_price_matrix: (server generations, latency sensitivities)
+    # A PIVOT THAT THE TABLES DO NOT FIT (E.G. UNKNOWN GENERATIONS) IS LEFT OUT.
+    # IMPORTED HERE: evaluation IMPORTS utils
+    from evaluation import get_known, get_demand_base, change_selling_prices_format
+    arrays = {}
+    try:
+        arrays['demand_time_steps'], arrays['demand_cube'] = get_demand_base(tables['demand'])
+    except (KeyError, ValueError):
+        pass
+    prices = change_selling_prices_format(tables['selling_prices'])
+    generations, latency_sensitivities = get_known('server_generation'), get_known('latency_sensitivity')
+    if set(prices.index) == set(generations) and set(prices.columns) == set(latency_sensitivities):
+        arrays['selling_price_matrix'] = prices.reindex(index=generations, columns=latency_sensitivities).values
+    return arrays
+
+def build_problem_data_cache(path, cache_path):
+    # PARSE THE CSV FILES ONCE AND SAVE EVERY COLUMN AS A .npy FILE, PLUS THE
+    # ARRAYS OF get_problem_pivots.
+    # THE CACHE IS WRITTEN TO A TEMPORARY FOLDER AND RENAMED, SO PROCESSES
+    # BUILDING IT AT THE SAME TIME DO NOT SEE A HALF-WRITTEN CACHE.
+    tables = {name: read_problem_table(path, name) for name in PROBLEM_DATA_FILES}
+    arrays = {}
+    manifest = {}
+    for name, table in tables.items():
+        manifest[name] = list(table.columns)
+        for col in table.columns:
+            values = table[col].values
+            arrays[f'{name}.{col}'] = values.astype(str) if values.dtype == object else values
+    arrays.update(get_problem_pivots(tables))
+    os.makedirs(dirname(cache_path), exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=dirname(cache_path))
+    for key, values in arrays.items():
+        np.save(join(tmp, f'{key}.npy'), values, allow_pickle=False)
+    save_json(join(tmp, 'manifest.json'), manifest)
+    try:
+        os.rename(tmp, cache_path)
+    except OSError:
+        # ANOTHER PROCESS HAS ALREADY BUILT THE SAME CACHE
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def load_problem_arrays(path=None, read_only=False):
+    # LOAD THE CACHED PROBLEM DATA, BUILDING THE CACHE FIRST WHEN THE CSV FILES
+    # HAVE CHANGED. THE KEYS ARE <table>.<column>, THE ARRAYS OF
+    # get_problem_pivots AND manifest, THE COLUMNS OF EVERY TABLE. WITH
+    # read_only THE ARRAYS ARE READ-ONLY MEMORY MAPS OF THE CACHE FILES.
     if path is None:
         path = './data/'
+    cache_path = get_problem_data_cache_path(path)
+    if not exists(join(cache_path, 'manifest.json')):
+        build_problem_data_cache(path, cache_path)
+    mmap_mode = 'r' if read_only else None
+    arrays = {f[:-len('.npy')]: np.load(join(cache_path, f), mmap_mode=mmap_mode, allow_pickle=False)
+              for f in os.listdir(cache_path) if f.endswith('.npy')}
+    arrays['manifest'] = load_json(join(cache_path, 'manifest.json'))
+    return arrays
 
-    # LOAD DEMAND
-    p = abspath(join(path, 'demand.csv'))
-    demand = pd.read_csv(p)    
-    
-    # LOAD DATACENTERS DATA
-    p = abspath(join(path, 'datacenters.csv'))
-    datacenters = pd.read_csv(p)
-    
-    # LOAD SERVERS DATA
-    p = abspath(join(path, 'servers.csv'))
-    servers = pd.read_csv(p)
-    
-    # LOAD SELLING PRICES DATA
-    p = abspath(join(path, 'selling_prices.csv'))
-    selling_prices = pd.read_csv(p)
-    return demand, datacenters, servers, selling_prices
+def get_problem_table(arrays, name):
+    # REBUILD THE DataFrame OF A PROBLEM TABLE FROM THE CACHED ARRAYS, WITH THE
+    # SAME COLUMNS AND DTYPES AS pd.read_csv. THE NUMERIC COLUMNS ARE THE
+    # CACHED ARRAYS THEMSELVES, NOT COPIES.
+    columns = {}
+    for col in arrays['manifest'][name]:
+        values = arrays[f'{name}.{col}']
+        columns[col] = values.astype(object) if values.dtype.kind == 'U' else values
+    return pd.DataFrame(columns, copy=False)
 
-def load_problem_data_without_demand(path=None):
+# PIVOTS OF THE TABLES LOADED FROM THE CACHE, BY id OF THE TABLE:
+# (weakref OF THE TABLE, ITS COLUMNS WHEN IT WAS LOADED, THE PIVOT)
+_table_pivots = {}
+
+def set_table_pivot(table, pivot):
+    # REMEMBER THE PIVOT OF A TABLE UNTIL THE TABLE IS GARBAGE COLLECTED
+    key = id(table)
+    snapshot = {col: table[col].values.copy() for col in table.columns}
+    _table_pivots[key] = (weakref.ref(table, lambda _: _table_pivots.pop(key, None)), snapshot, pivot)
+
+def get_table_pivot(table):
+    # THE PIVOT OF A TABLE OF load_problem_tables, OR None WHEN THE TABLE HAS
+    # NONE OR WAS CHANGED SINCE IT WAS LOADED
+    entry = _table_pivots.get(id(table))
+    if entry is None or entry[0]() is not table:
+        return None
+    snapshot = entry[1]
+    if list(table.columns) != list(snapshot) or len(table) != len(next(iter(snapshot.values()), [])):
+        return None
+    if not all(np.array_equal(table[col].values, values) for col, values in snapshot.items()):
+        return None
+    return entry[2]
+
+def load_problem_tables(names, path=None, use_cache=True, read_only=False):
+    # LOAD PROBLEM TABLES FROM THE CACHE, OR FROM THE CSV FILES WHEN THE CACHE
+    # IS DISABLED OR CANNOT BE WRITTEN. THE TABLES ARE WRITABLE COPIES UNLESS
+    # read_only, WHICH GIVES NUMERIC COLUMNS BACKED BY THE READ-ONLY MEMORY
+    # MAPS OF THE CACHE (NO COPY, SHARED BETWEEN PROCESSES). THE demand AND
+    # selling_prices TABLES OF THE CACHE CARRY THEIR PIVOT, SEE get_table_pivot.
     if path is None:
-        path = './data/'  
-    
-    # LOAD DATACENTERS DATA
-    p = abspath(join(path, 'datacenters.csv'))
-    datacenters = pd.read_csv(p)
-    
-    # LOAD SERVERS DATA
-    p = abspath(join(path, 'servers.csv'))
-    servers = pd.read_csv(p)
-    
-    # LOAD SELLING PRICES DATA
-    p = abspath(join(path, 'selling_prices.csv'))
-    selling_prices = pd.read_csv(p)
+        path = './data/'
+    if use_cache:
+        try:
+            arrays = load_problem_arrays(path, read_only)
+        except OSError:
+            arrays = None
+        if arrays is not None:
+            tables = [get_problem_table(arrays, name) for name in names]
+            for name, table in zip(names, tables):
+                if name == 'demand' and 'demand_cube' in arrays:
+                    set_table_pivot(table, (arrays['demand_time_steps'], arrays['demand_cube']))
+                elif name == 'selling_prices' and 'selling_price_matrix' in arrays:
+                    set_table_pivot(table, arrays['selling_price_matrix'])
+            return tables
+    return [read_problem_table(path, name) for name in names]
+
+def load_problem_data(path=None, use_cache=True, read_only=False):
+    demand, datacenters, servers, selling_prices = load_problem_tables(['demand', 'datacenters', 'servers', 'selling_prices'], path, use_cache, read_only)
+    return demand, datacenters, servers, selling_prices
+
+def load_problem_data_without_demand(path=None, use_cache=True, read_only=False):
+    datacenters, servers, selling_prices = load_problem_tables(['datacenters', 'servers', 'selling_prices'], path, use_cache, read_only)
     return datacenters, servers, selling_prices
 
-def load_demand(path=None):
-    if path is None:
-        path = './data/'  
-    
-    # LOAD DEMAND
-    p = abspath(join(path, 'demand.csv'))
-    demand = pd.read_csv(p)  
+def load_demand(path=None, use_cache=True, read_only=False):
+    demand, = load_problem_tables(['demand'], path, use_cache, read_only)
     return demand
 
+# Objects shared with the workers of a pool of get_shared_pool, by name
+_shared = {}
+
+def _set_shared(shared):
+    _shared.update(shared)
+
+def get_shared(name, default=None):
+    # AN OBJECT OF THE POOL OF get_shared_pool, OR default OUTSIDE OF IT
+    return _shared.get(name, default)
+
+def get_shared_pool(processes=None, **shared):
+    # POOL OF WORKERS THAT SEE THE KEYWORD ARGUMENTS THROUGH get_shared. WITH THE
+    # 'fork' START METHOD (THE DEFAULT ON LINUX) THE WORKERS INHERIT THEM FROM
+    # THE PARENT WITHOUT COPYING OR PICKLING THEM.
+    context = get_context('fork') if 'fork' in get_all_start_methods() else get_context()
+    return context.Pool(processes=processes, initializer=_set_shared, initargs=(shared,))
+
 if __name__ == '__main__':
     # Load solution
     path = './data/solution_example.json'
@@ -73,4 +331,4 @@ if __name__ == '__main__':
     print(solution)
     # Save solution
     # path = './data/solution_example_test.json'
-    # save_solution(solution, path)
\ No newline at end of file
+    # save_solution(solution, path)
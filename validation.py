@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+from utils import load_problem_data, load_solution_columns, SOLUTION_COLUMNS
+from evaluation import get_known, get_fleet_tables
+
+'''
+
+Single-pass validation of a solution, to reject bad candidates before scoring them.
+
+validate_solution scans the rows once, time-step by time-step, and keeps the
+fleet as arrays indexed by the interned server id. It reports every violation
+with the row number (the position of the row in the file or DataFrame):
+
+    unknown_action        : the action is not one of get_known('actions')
+    unknown_datacenter    : the datacenter_id is not one of get_known('datacenter_id')
+    unknown_generation    : the server_generation is not one of get_known('server_generation')
+    time_step_range       : the time_step is not in 1..time_steps
+    first_step_action     : an action other than "buy" at time-step 1
+    release_time          : a server bought outside the release window of its generation
+    duplicate_buy         : a server_id that appeared in an earlier row is bought
+    duplicate_action      : a second action for the same server in the same time-step
+    unknown_server        : a server that is not in the fleet is moved or dismissed
+    slots_capacity        : a datacenter is over its slots capacity after the
+                            actions and the expiries of a time-step (row is -1)
+
+The evaluator drops the rows of unknown actions, datacenters and generations and
+the duplicates; the violations marked fatal make evaluation_function return None.
+Like the evaluator, the slots capacity of a datacenter is the mean slots_capacity
+of the home datacenters of its servers. Unlike the evaluator, a time-step that
+starts with an empty fleet is not special: its moves and dismissals of servers
+that are not in the fleet are reported as unknown_server.
+
+The scan is linear in the number of rows: the rows are grouped by time-step with
+a stable radix sort and every time-step is a few array operations over its own rows.
+
+'''
+
+VIOLATION_COLUMNS = ['row', 'time_step', 'datacenter_id', 'server_generation', 'server_id', 'action', 'violation', 'fatal', 'message']
+
+FATAL_VIOLATIONS = ['first_step_action', 'unknown_server', 'slots_capacity']
+
+def get_known_labels():
+    # LABELS THAT GET THE FIRST CODES OF load_solution_columns, SO THAT A CODE
+    # IS AN INDEX INTO get_known AND LARGER CODES ARE UNKNOWN VALUES
+    return {'datacenter_id': get_known('datacenter_id'),
+            'server_generation': get_known('server_generation'),
+            'action': get_known('actions')}
+
+def get_columns_from_frame(solution, known=None):
+    # SAME COLUMNS AS load_solution_columns FOR A SOLUTION DataFrame
+    missing = [c for c in SOLUTION_COLUMNS if c not in solution.columns]
+    if missing:
+        raise(ValueError('Please check the solution format.'))
+    known = known or {}
+    columns = {'time_step': solution['time_step'].values, 'labels': {}, 'order': SOLUTION_COLUMNS}
+    for c in SOLUTION_COLUMNS[1:]:
+        values = np.concatenate([np.array(known.get(c, []), dtype=object), solution[c].values.astype(object)])
+        codes, labels = pd.factorize(values, use_na_sentinel=False)
+        columns[c] = codes[len(known.get(c, [])):]
+        columns['labels'][c] = list(labels)
+    return columns
+
+def validate_solution(solution, datacenters=None, servers=None, time_steps=get_known('time_steps'), max_violations=None):
+    # VALIDATE A SOLUTION (A PATH TO A .json, .jsonl OR .cols FILE, A DataFrame OR THE
+    # COLUMNS OF load_solution_columns) AND RETURN ITS VIOLATIONS AS A
+    # DataFrame WITH VIOLATION_COLUMNS, IN TIME-STEP ORDER. THE SCAN STOPS
+    # AFTER THE TIME-STEP WHERE max_violations IS REACHED.
+    if datacenters is None or servers is None:
+        _, datacenters, servers, _ = load_problem_data()
+    known = get_known_labels()
+    if isinstance(solution, pd.DataFrame):
+        columns = get_columns_from_frame(solution, known)
+    elif isinstance(solution, dict):
+        columns = solution
+    else:
+        try:
+            columns = load_solution_columns(solution, known)
+        except (KeyError, TypeError, OverflowError):
+            raise(ValueError('Please check the solution format.'))
+    labels = columns['labels']
+    # RECODE TO THE ORDER OF get_known WHEN THE COLUMNS HAVE OTHER LABELS
+    codes = {}
+    for c, k in known.items():
+        mapping = {v: i for i, v in enumerate(k)}
+        recode = np.array([mapping.get(v, len(k)) for v in labels[c]], dtype=np.int64)
+        codes[c] = recode[columns[c]] if len(recode) else np.asarray(columns[c], dtype=np.int64)
+    time_step = np.asarray(columns['time_step'], dtype=np.int64)
+    server = np.asarray(columns['server_id'], dtype=np.int64)
+    n_servers = len(labels['server_id'])
+    n_dc = len(known['datacenter_id'])
+    n_rows = len(time_step)
+    tables = get_fleet_tables(servers, datacenters)
+
+    violations = []
+    def report(rows, violation, message):
+        for row in np.atleast_1d(rows).tolist():
+            violations.append((row, violation, message))
+
+    # ROW CHECKS THAT DO NOT DEPEND ON THE FLEET
+    action, datacenter, generation = codes['action'], codes['datacenter_id'], codes['server_generation']
+    buy, move, dismiss = [known['action'].index(a) for a in ['buy', 'move', 'dismiss']]
+    report(np.flatnonzero(action >= len(known['action'])), 'unknown_action', 'Unknown action.')
+    report(np.flatnonzero(datacenter >= n_dc), 'unknown_datacenter', 'Unknown datacenter_id.')
+    report(np.flatnonzero(generation >= len(known['server_generation'])), 'unknown_generation', 'Unknown server_generation.')
+    report(np.flatnonzero((time_step < 1) | (time_step > time_steps)), 'time_step_range', f'time_step is not in 1..{time_steps}.')
+    report(np.flatnonzero((time_step == 1) & (action != buy)), 'first_step_action', 'At time-step 1 it is only possible to use the "buy" action.')
+    known_generation = generation < len(known['server_generation'])
+    g = np.where(known_generation, generation, 0)
+    outside = (time_step < tables['release_start'][g]) | (time_step > tables['release_end'][g])
+    report(np.flatnonzero((action == buy) & known_generation & outside), 'release_time', 'Server bought outside its release window.')
+    # A BUY OF A server_id THAT APPEARED IN AN EARLIER ROW IS DROPPED BY THE EVALUATOR
+    first = np.full(n_servers, n_rows, dtype=np.int64)
+    np.minimum.at(first, server, np.arange(n_rows))
+    duplicate_buy = (action == buy) & (first[server] < np.arange(n_rows))
+    report(np.flatnonzero(duplicate_buy), 'duplicate_buy', 'The server_id was already used in an earlier row.')
+    # ROWS THE EVALUATOR KEEPS
+    valid = ((action < len(known['action'])) & (datacenter < n_dc) & known_generation &
+             (time_step >= 1) & (time_step <= time_steps) & ~duplicate_buy)
+
+    # FLEET BY SERVER CODE
+    alive = np.zeros(n_servers, dtype=bool)
+    server_generation = np.zeros(n_servers, dtype=np.int64)
+    server_datacenter = np.zeros(n_servers, dtype=np.int64)
+    server_home = np.zeros(n_servers, dtype=np.int64)
+    expiring = {}
+    dc_servers = np.zeros(n_dc, dtype=np.int64)
+    dc_slots = np.zeros(n_dc, dtype=np.int64)
+    dc_capacity = np.zeros(n_dc, dtype=np.int64)
+    slots_size, slots_capacity = tables['slots_size'].astype(np.int64), tables['slots_capacity'].astype(np.int64)
+
+    def update_slots(s, sign):
+        d = server_datacenter[s]
+        dc_servers[:] += sign * np.bincount(d, minlength=n_dc)
+        dc_slots[:] += sign * np.bincount(d, weights=slots_size[server_generation[s]], minlength=n_dc).astype(np.int64)
+        dc_capacity[:] += sign * np.bincount(d, weights=slots_capacity[server_home[s]], minlength=n_dc).astype(np.int64)
+
+    # GROUP THE ROWS BY TIME-STEP (STABLE, SO THE ROWS OF A TIME-STEP KEEP THEIR ORDER)
+    order = np.flatnonzero(valid)
+    order = order[np.argsort(time_step[order], kind='stable')]
+    bounds = np.searchsorted(time_step[order], np.arange(time_steps + 2))
+    for ts in range(1, time_steps + 1):
+        rows = order[bounds[ts]:bounds[ts + 1]]
+        if len(rows):
+            # ONE ACTION PER SERVER AND TIME-STEP, THE FIRST ONE IS KEPT
+            _, keep = np.unique(server[rows], return_index=True)
+            repeated = np.ones(len(rows), dtype=bool)
+            repeated[keep] = False
+            report(rows[repeated], 'duplicate_action', 'Second action for the same server in the same time-step.')
+            rows = rows[~repeated]
+            a, s = action[rows], server[rows]
+            # BUY
+            b = rows[a == buy]
+            sb = server[b]
+            alive[sb] = True
+            server_generation[sb] = generation[b]
+            server_datacenter[sb] = datacenter[b]
+            server_home[sb] = datacenter[b]
+            update_slots(sb, 1)
+            for life, group in pd.Series(sb).groupby(tables['life_expectancy'][generation[b]]):
+                expiring.setdefault(ts + int(life) - 1, []).append(group.values)
+            # MOVE AND DISMISS OF SERVERS THAT ARE NOT IN THE FLEET
+            m = (a == move) | (a == dismiss)
+            missing = m & ~alive[s]
+            report(rows[missing], 'unknown_server', 'The server is not in the fleet.')
+            # MOVE
+            sm = s[(a == move) & ~missing]
+            update_slots(sm, -1)
+            server_datacenter[sm] = datacenter[rows[(a == move) & ~missing]]
+            update_slots(sm, 1)
+            # DISMISS
+            sd = s[(a == dismiss) & ~missing]
+            update_slots(sd, -1)
+            alive[sd] = False
+        # EXPIRY: SERVERS REACH THEIR LIFE EXPECTANCY AT THE END OF THE TIME-STEP
+        for se in expiring.pop(ts, []):
+            se = se[alive[se]]
+            update_slots(se, -1)
+            alive[se] = False
+        # SLOTS CAPACITY
+        used = dc_servers > 0
+        capacity = dc_capacity / np.maximum(dc_servers, 1)
+        for d in np.flatnonzero(used & (dc_slots > capacity)):
+            violations.append((-1, 'slots_capacity',
+                               f"{known['datacenter_id'][d]} uses {dc_slots[d]} slots of {capacity[d]} at time-step {ts}.",
+                               ts, known['datacenter_id'][d]))
+        if max_violations is not None and len(violations) >= max_violations:
+            break
+    return get_violations_frame(violations, columns, time_step)
+
+def get_violations_frame(violations, columns, time_step):
+    # HELPER FUNCTION TO TURN THE (row, violation, message[, time_step, datacenter_id])
+    # TUPLES INTO THE VIOLATIONS DataFrame
+    records = []
+    labels = columns['labels']
+    for v in violations:
+        row, violation, message = v[:3]
+        if row >= 0:
+            record = {'row': row, 'time_step': int(time_step[row])}
+            for c in ['datacenter_id', 'server_generation', 'server_id', 'action']:
+                record[c] = labels[c][columns[c][row]]
+        else:
+            record = {'row': -1, 'time_step': v[3], 'datacenter_id': v[4],
+                      'server_generation': None, 'server_id': None, 'action': None}
+        record.update({'violation': violation, 'fatal': violation in FATAL_VIOLATIONS, 'message': message})
+        records.append(record)
+    frame = pd.DataFrame.from_records(records, columns=VIOLATION_COLUMNS)
+    return frame.sort_values(['time_step', 'row'], kind='stable', ignore_index=True)
+
+def is_valid_solution(solution, datacenters=None, servers=None, time_steps=get_known('time_steps')):
+    # FAST FAIL: True WHEN THE SOLUTION HAS NO FATAL VIOLATION. STOPS AT THE
+    # FIRST TIME-STEP WITH A VIOLATION.
+    violations = validate_solution(solution, datacenters, servers, time_steps, max_violations=1)
+    return not violations['fatal'].any()